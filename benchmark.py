@@ -0,0 +1,71 @@
+import sys
+import time
+
+import pandas as pd
+
+from model.allocator import HeuristicAllocator, OptimizedAllocator
+from model.model import SimpleFundModel
+from pool.df import FundFactDF
+
+
+def candidates(n):
+    """事实表中收益率最高的 n 个基金, 字段与 FundParamDF 相同 (用于测试较大的候选基金池)"""
+    df = FundFactDF(columns=["CODE", "TYPE", "FUND_VALUE", "RATE_1Y", "RATE_2Y", "RATE_3Y", "COMMISSION"]).df
+    df = df.drop_duplicates(subset=["CODE"])
+    df["RATE"] = (df.RATE_1Y + df.RATE_2Y + df.RATE_3Y) / 3
+    df = df.dropna(subset=["RATE", "TYPE"]).nlargest(n, "RATE")
+    df["VALUE"] = df.FUND_VALUE
+    df["PROFIT"] = df.VALUE * df.RATE / 100
+    return df[["CODE", "TYPE", "VALUE", "RATE", "PROFIT", "COMMISSION"]].reset_index(drop=True)
+
+
+def evaluate(model, fund):
+    """分配结果的预期收益率和集中度 (最大的比例)"""
+    df = fund.merge(model.pool[["CODE", "TYPE", "RATE"]], on="CODE")
+    info = FundFactDF(columns=["CODE", "COMP_ID"]).df.drop_duplicates(subset=["CODE"])
+    df = df.merge(info, on="CODE", how="left")
+    from fundstar.index import get_manager_index
+    pairs = get_manager_index().pairs
+    total = df.BUDGET.sum()
+    manager = pairs.merge(df[["CODE", "BUDGET"]], on="CODE").groupby("MANAGER").BUDGET.sum()
+    return {
+        "RATE": (df.BUDGET * df.RATE).sum() / total,
+        "FUNDS": len(df),
+        "MAX_FUND": df.BUDGET.max() / total,
+        "MAX_TYPE": df.groupby("TYPE", observed=True).BUDGET.sum().max() / total,
+        "MAX_COMPANY": df.groupby("COMP_ID").BUDGET.sum().max() / total,
+        "MAX_MANAGER": manager.max() / total if len(manager) else 0,
+    }
+
+
+def benchmark(sizes, budgets, unit=5):
+    """比较默认的分配方法和优化的分配方法。
+    :param sizes: 候选基金数量的列表, None 表示使用基金池 (FundParamDF)
+    :return: DataFrame, 每个 (候选基金数量, 预算, 分配方法) 一行
+    """
+    rows = []
+    for size in sizes:
+        for budget in budgets:
+            allocators = {"heuristic": HeuristicAllocator(), "optimized": OptimizedAllocator()}
+            for name, allocator in allocators.items():
+                model = SimpleFundModel(budget=budget, unit=unit)
+                if size is not None:
+                    model.pool = candidates(size)
+                start = time.perf_counter()
+                fund = allocator.allocate(model)
+                seconds = time.perf_counter() - start
+                row = {"CANDIDATES": len(model.pool), "BUDGET": budget, "ALLOCATOR": name, "SECONDS": seconds}
+                row.update(evaluate(model, fund))
+                if name == "optimized":
+                    row["BOUND"] = allocator.bound(model)
+                rows.append(row)
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    # 候选基金数量, 例如: python benchmark.py 1000 5000
+    sizes = [None] + [int(n) for n in sys.argv[1:]] if len(sys.argv) > 1 else [None, 1000, 5000]
+    result = benchmark(sizes, budgets=[50, 500, 5000])
+    print("==== Benchmark ====")
+    with pd.option_context("display.width", 200, "display.max_columns", 20):
+        print(result.round(4).to_string(index=False))
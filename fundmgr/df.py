@@ -17,11 +17,18 @@ class FundManagerDF(DFLoader):
         "FUND_VAL",  # 现任基金资产总规模 (单位: 亿元)
         "RATE_MAX",  # 现任基金最佳回报 (单位: %)
     ]
+    dtypes = {
+        "NAME": "category",
+        "COMPANY": "category",
+        "FUND_VAL": "float32",
+        "RATE_MAX": "float32",
+    }
     expire = 30
+    key = ["NO", "FUND"]
 
-    def __init__(self):
+    def __init__(self, **kwargs):
         super().__init__(expire=self.expire,
-                         header=self.header)
+                         header=self.header, **kwargs)
 
     def get(self):
         self.df = ak.fund_manager_em()
\ No newline at end of file
@@ -33,7 +33,7 @@ class FundManagerPlot:
 
     def hist_val_max(self):
         # 计算基金经理管理的基金规模（多支基金取Max）
-        df = self.df.groupby("NAME")["FUND_VAL"].max().reset_index()
+        df = self.df.groupby("NAME", observed=True)["FUND_VAL"].max().reset_index()
         # 选择规模在 [lb, ub] 的基金经理
         lb, ub = 1, 1000
         df = df[df["FUND_VAL"] >= lb]
@@ -52,7 +52,7 @@ class FundManagerPlot:
 
     def hist_rate_max(self):
         # 计算基金经理任期的最大收益率（多支基金取median）
-        df = self.df.groupby("NAME")["RATE_MAX"].median().reset_index()
+        df = self.df.groupby("NAME", observed=True)["RATE_MAX"].median().reset_index()
         # 选择收益率在 [lb, ub] 的基金经理
         lb, ub = 0, 200
         df = df[df["RATE_MAX"] >= lb]
@@ -71,7 +71,7 @@ class FundManagerPlot:
 
     def hist_rate_company(self):
         # 计算基金公司的平均收益率（基金经理任期的最大收益率的中位数）
-        df = self.df.groupby("COMPANY")["RATE_MAX"].median().reset_index()
+        df = self.df.groupby("COMPANY", observed=True)["RATE_MAX"].median().reset_index()
         # 画图
         plt.figure(figsize=self.figsize)
         plt.hist(df.RATE_MAX, bins=self.bins,
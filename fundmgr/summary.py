@@ -1,5 +1,7 @@
 import numpy as np
 
+from fundstar.index import get_manager_index
+from utils import Stats
 from .df import FundManagerDF
 
 
@@ -18,25 +20,27 @@ class FundManagerSummary:
         manager_count = self.df.NO.nunique()
         company_count = self.df.COMPANY.nunique()
         # 基金经理从业年限, 中位数, 平均数, 20%分位数, 80%分位数
-        manager_exp_median = self.df.EXP.median()
-        manager_exp_mean = self.df.EXP.mean()
+        stats = Stats(self.df.EXP)
+        manager_exp_median = stats.median()
+        manager_exp_mean = stats.mean
         percents = [20, 80]
         percents_to_floats = np.array(percents)/100
-        manager_exp_quantile = self.df.EXP.quantile(percents_to_floats)
+        manager_exp_quantile = stats.quantile(percents_to_floats)
         # 管理基金规模, 中位数, 平均数, 20%分位数, 80%分位数
-        df = self.df.groupby("NAME")["FUND_VAL"].max().reset_index()
-        fund_val_median = df.FUND_VAL.median()
-        fund_val_mean = df.FUND_VAL.mean()
-        fund_val_quantile = df.FUND_VAL.quantile(percents_to_floats)
+        stats = Stats(self.df.groupby("NAME", observed=True)["FUND_VAL"].max())
+        fund_val_median = stats.median()
+        fund_val_mean = stats.mean
+        fund_val_quantile = stats.quantile(percents_to_floats)
         # 任期最大收益率, 中位数, 平均数, 20%分位数, 80%分位数
-        df = self.df.groupby(["NO", "NAME"])["RATE_MAX"].median().reset_index()
-        rate_max_median = df.RATE_MAX.median()
-        rate_max_mean = df.RATE_MAX.mean()
-        rate_max_quantile = df.RATE_MAX.quantile(percents_to_floats)
+        df = self.df.groupby(["NO", "NAME"], observed=True)["RATE_MAX"].median().reset_index()
+        stats = Stats(df.RATE_MAX)
+        rate_max_median = stats.median()
+        rate_max_mean = stats.mean
+        rate_max_quantile = stats.quantile(percents_to_floats)
         # top-k 基金经理: 按任期的最大收益率计算
         manager_top_k = df.sort_values("RATE_MAX", ascending=False).head(self.manger_top_k)
         # top-k 基金公司: 按最大收益率的中位数计算
-        df = self.df.groupby("COMPANY")["RATE_MAX"].median().reset_index()
+        df = self.df.groupby("COMPANY", observed=True)["RATE_MAX"].median().reset_index()
         company_top_k = df.sort_values("RATE_MAX", ascending=False).head(self.company_top_k)
 
         return {
@@ -64,16 +68,19 @@ class FundManagerSummary:
 
     def _print_manger_top_k(self, manager):
         df = self.df[self.df.NO.isin(manager.NO)]
-        df = df.groupby(['NO', 'NAME', 'COMPANY', "EXP"]).RATE_MAX.median().reset_index()
+        df = df.groupby(['NO', 'NAME', 'COMPANY', "EXP"], observed=True).RATE_MAX.median().reset_index()
         df = df.sort_values("RATE_MAX", ascending=False)
+        # 有评级的基金数量 (参考 fundstar.index)
+        fund_count = get_manager_index().fund_count()
         print(f"|-- 基金经理排行")
         for i, row in enumerate(df.itertuples(), start=1):
             print(f"   |-- {i}: {row.NAME}, {row.COMPANY}, "
-                  f"从业{int(row.EXP)}天, 任期最大回报率: {row.RATE_MAX:.2f}%")
+                  f"从业{int(row.EXP)}天, 任期最大回报率: {row.RATE_MAX:.2f}%, "
+                  f"评级基金数: {fund_count.get(row.NAME, 0)}")
 
     def _print_company_top_k(self, company):
         df = self.df[self.df.COMPANY.isin(company.COMPANY)]
-        df = df.groupby('COMPANY').RATE_MAX.median().reset_index()
+        df = df.groupby('COMPANY', observed=True).RATE_MAX.median().reset_index()
         df = df.sort_values("RATE_MAX", ascending=False)
         print(f"|-- 基金公司排行")
         for i, row in enumerate(df.itertuples(), start=1):
@@ -31,11 +31,28 @@ class HBFundRateDF(DFLoader):
         "RATE_ALL",  # 成立来 (单位: %)
         "COMMITION",  # 手续费
     ]
+    dtypes = {
+        "CODE": "code",
+        "DATE": "category",
+        "RATE_10K": "float32",
+        "RATE_7D": "float32",
+        "RATE_14D": "float32",
+        "RATE_28D": "float32",
+        "RATE_1M": "float32",
+        "RATE_3M": "float32",
+        "RATE_6M": "float32",
+        "RATE_1Y": "float32",
+        "RATE_2Y": "float32",
+        "RATE_3Y": "float32",
+        "RATE_5Y": "float32",
+        "RATE_0Y": "float32",
+        "RATE_ALL": "float32",
+    }
     expire = 30
 
-    def __init__(self):
+    def __init__(self, **kwargs):
         super().__init__(expire=self.expire,
-                         header=self.header)
+                         header=self.header, **kwargs)
 
     def get(self):
         self.df = ak.fund_money_rank_em()
@@ -69,11 +86,26 @@ class CNFundRateDF(DFLoader):
         "QTY",  # 可购买的量
         "COMMITION",  # 手续费
     ]
+    dtypes = {
+        "CODE": "code",
+        "DATE": "category",
+        "RATE_1": "float32",
+        "RATE_ACC": "float32",
+        "RATE_1W": "float32",
+        "RATE_1M": "float32",
+        "RATE_3M": "float32",
+        "RATE_6M": "float32",
+        "RATE_1Y": "float32",
+        "RATE_2Y": "float32",
+        "RATE_3Y": "float32",
+        "RATE_0Y": "float32",
+        "RATE_ALL": "float32",
+    }
     expire = 30
 
-    def __init__(self):
+    def __init__(self, **kwargs):
         super().__init__(expire=self.expire,
-                         header=self.header)
+                         header=self.header, **kwargs)
 
     def get(self):
         self.df = ak.fund_exchange_rank_em()
@@ -107,11 +139,29 @@ class OpenFundRateDF(DFLoader):
         "CUSTOM",  # 自定义 (单位: %)
         "COMMITION",  # 手续费
     ]
+    dtypes = {
+        "CODE": "code",
+        "DATE": "category",
+        "COMMITION": "category",
+        "RATE_1": "float32",
+        "RATE_ACC": "float32",
+        "RATE_D": "float32",
+        "RATE_1W": "float32",
+        "RATE_1M": "float32",
+        "RATE_3M": "float32",
+        "RATE_6M": "float32",
+        "RATE_1Y": "float32",
+        "RATE_2Y": "float32",
+        "RATE_3Y": "float32",
+        "RATE_0Y": "float32",
+        "RATE_ALL": "float32",
+        "CUSTOM": "float32",
+    }
     expire = 30
 
-    def __init__(self):
+    def __init__(self, **kwargs):
         super().__init__(expire=self.expire,
-                         header=self.header)
+                         header=self.header, **kwargs)
 
     def get(self):
         self.df = ak.fund_open_fund_rank_em(symbol="全部")
@@ -141,11 +191,27 @@ class HKFundRateDF(DFLoader):
         "QTY",  # 可购买
         "HK_CODE",  # 香港基金代码
     ]
+    dtypes = {
+        "CODE": "code",
+        "CURRENCY": "category",
+        "DATE": "category",
+        "RATE_1": "float32",
+        "RATE_D": "float32",
+        "RATE_1W": "float32",
+        "RATE_1M": "float32",
+        "RATE_3M": "float32",
+        "RATE_6M": "float32",
+        "RATE_1Y": "float32",
+        "RATE_2Y": "float32",
+        "RATE_3Y": "float32",
+        "RATE_0Y": "float32",
+        "RATE_ALL": "float32",
+    }
     expire = 30
 
-    def __init__(self):
+    def __init__(self, **kwargs):
         super().__init__(expire=self.expire,
-                         header=self.header)
+                         header=self.header, **kwargs)
 
     def get(self):
         self.df = ak.fund_hk_rank_em()
@@ -34,7 +34,7 @@ class FundRatePlot:
         assert source in self.sources.keys(), f"source must be in {list(self.sources.keys())}"
         assert span in self.columns.keys(), f"span must be in {list(self.columns.keys())}"
         self.column = self.columns[span]
-        self.df = self.sources[source]().df
+        self.df = self.sources[source](columns=[self.column]).df
 
     def hist(self):
         # 画直方图
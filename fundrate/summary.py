@@ -2,6 +2,7 @@ import math
 
 import numpy as np
 
+from utils import Stats
 from .df import OpenFundRateDF, HKFundRateDF, CNFundRateDF, HBFundRateDF
 
 
@@ -29,8 +30,9 @@ class FundRateSummary:
         self.source=source
         self.span = span
         self.column = self.columns[span]
-        self.source_obj = self.sources[source]()
+        self.source_obj = self.sources[source](columns=[self.column])
         self.df = self.source_obj.df[self.column].dropna()  # 去掉空数据
+        self.stats = Stats(self.df)  # 排序一次, 分桶和分位数都基于它计算
 
     def _count_bucket(self, buckets, positive=True):
         """分桶计算区间内的基金数量（单位：%）
@@ -40,39 +42,33 @@ class FundRateSummary:
             当positive = False 时, 代表区间 [-3%, 0), [-5%, -3%), [-10%, -5%), [-20%, -10%), (-∞, -20%)
         注意：返回结果的长度比 buckets 长度多 1
         """
-        df = self.df.copy()
-        if positive is False:
-            df = -df[df < 0]
-        buckets = [0, *buckets, math.inf]
-        buckets_num = [
-            len(df[(df >= buckets[i]) & (df < buckets[i + 1])])
-            for i in range(len(buckets) - 1)
-        ]
-        return buckets_num
+        buckets = np.array([0, *buckets, math.inf])
+        if positive:
+            return self.stats.count(buckets).tolist()
+        # 亏损: -x 在 [buckets[i], buckets[i+1]) 内且 x < 0, 即 x 在 (-buckets[i+1], -buckets[i]] 内且 x < 0
+        less = self.stats.less(-buckets, inclusive=True)
+        less[0] = self.stats.less(0)
+        return (less[:-1] - less[1:]).tolist()
 
     def _get_percentile_ci(self, confidence_levels):
         """ 根据分位数计算置信区间
         :param confidence_levels: 置信度列表
         :return: 根据每个置信度，计算对应的置信区间。
         """
-        confidence_intervals = []
-        for cl in confidence_levels:
-            lower_percentile = 50 - cl/2
-            upper_percentile = 50 + cl/2
-            lower_bound = self.df.quantile(lower_percentile / 100)
-            upper_bound = self.df.quantile(upper_percentile / 100)
-            confidence_intervals.append((lower_bound, upper_bound))
-        return confidence_intervals
+        confidence_levels = np.array(confidence_levels)
+        lower_bounds = self.stats.quantile((50 - confidence_levels / 2) / 100)
+        upper_bounds = self.stats.quantile((50 + confidence_levels / 2) / 100)
+        return list(zip(lower_bounds, upper_bounds))
 
     def _statistics(self):
         # - 基金数量
-        num = self.df.count()
-        # - 盈利数量和占比
-        profit_num = len(self.df[self.df >= 0])
-        profit_ratio = profit_num / num
+        num = self.stats.num
         # - 亏损数量和占比
-        loss_num = len(self.df[self.df < 0])
+        loss_num = int(self.stats.less(0))
         loss_ratio = loss_num / num
+        # - 盈利数量和占比
+        profit_num = num - loss_num
+        profit_ratio = profit_num / num
         # 分桶 （单位 %）
         # positive: [0, 3%), [3%, 5%), [5%, 10%), [10%, 20%), [20%, ∞)
         buckets = [3, 5, 10, 20]
@@ -88,13 +84,13 @@ class FundRateSummary:
         ]
 
         # - 收益率的中位数和均值
-        rate_median = self.df.median()
-        rate_mean = self.df.mean()
+        rate_median = self.stats.median()
+        rate_mean = self.stats.mean
         # - 收益率的标准差
-        rate_std = self.df.std()
+        rate_std = self.stats.std
         # - 百分位数 10%, 20%, 80%, 90%
         percents = [10, 20, 80, 90]
-        quantiles = self.df.quantile(np.array(percents)/100)
+        quantiles = self.stats.quantile(np.array(percents)/100)
         # - 置信区间
         confidence_levels = [95, 90, 85, 80]
         confidence_intervals = self._get_percentile_ci(confidence_levels)
@@ -1,2 +1,3 @@
+from .index import ManagerIndex, get_manager_index
 from .plot import FundStarPlot
 from .summary import FundStarSummary
\ No newline at end of file
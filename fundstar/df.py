@@ -23,11 +23,19 @@ class FundStarDF(DFLoader):
         "COMMITION",  # 手续费
         "TYPE",  # 类型
     ]
+    dtypes = {
+        "CODE": "code",
+        "COMPANY": "category",
+        "STAR_SHZQ": "float32",
+        "STAR_ZSZQ": "float32",
+        "STAR_JAJX": "float32",
+        "TYPE": "category",
+    }
     expire = 60
 
-    def __init__(self):
+    def __init__(self, **kwargs):
         super().__init__(expire=self.expire,
-                         header=self.header)
+                         header=self.header, **kwargs)
 
     def get(self):
         self.df = ak.fund_rating_all()
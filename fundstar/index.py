@@ -0,0 +1,53 @@
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+from .df import FundStarDF
+
+
+class ManagerIndex:
+
+    """ 基金经理和基金的倒排索引 (基于基金评级总汇 FundStarDF)
+    说明：FundStarDF 的 MANAGER 字段是用逗号分隔的多个基金经理, 例如 "张三,李四"。
+    这里把它拆分成 (CODE, MANAGER) 的对应关系, 用于按基金经理查基金, 或者按基金查基金经理。
+    """
+
+    def __init__(self, df):
+        df = df[["CODE", "MANAGER"]].dropna(subset=["MANAGER"])
+        managers = df.MANAGER.astype(str).str.strip('"').str.split(",")
+        pairs = pd.DataFrame({"CODE": df.CODE.to_numpy(), "MANAGER": managers.to_numpy()})
+        self.pairs = pairs.explode("MANAGER", ignore_index=True)
+
+    def funds(self, managers):
+        """基金经理 managers 管理的基金代码 (去重)"""
+        return self.pairs[self.pairs.MANAGER.isin(managers)].CODE.unique()
+
+    def managers(self, codes):
+        """基金 codes 的基金经理 (去重)"""
+        return self.pairs[self.pairs.CODE.isin(codes)].MANAGER.unique()
+
+    def fund_count(self):
+        """每个基金经理管理的 (有评级的) 基金数量"""
+        return self.pairs.groupby("MANAGER").CODE.nunique()
+
+
+_index = {}  # 数据目录 -> (快照日期, ManagerIndex), 每个目录只保留最新的快照
+_index_lock = threading.Lock()
+
+
+def get_manager_index(file_dir="./data"):
+    """获取数据目录 file_dir 中最新的 FundStarDF 快照的索引。同一个快照只建立一次索引。"""
+    loader = FundStarDF(columns=["CODE", "MANAGER"], file_dir=Path(file_dir))
+    key = str(loader.file_dir.resolve())
+    date = loader.get_cache_date()
+    with _index_lock:
+        if key in _index and _index[key][0] == date and not loader.is_expired():
+            return _index[key][1]
+    df = loader.df
+    # 加载时可能更新了数据
+    date = loader.get_cache_date()
+    index = ManagerIndex(df)
+    with _index_lock:
+        _index[key] = (date, index)
+    return index
@@ -51,7 +51,7 @@ class FundStarPlot:
         df = self.df
         df["STARS"] = self.df[["STAR_SHZQ", "STAR_ZSZQ", "STAR_JAJX"]].fillna(0).median(axis=1)
         df = df[df["STARS"] >= 5]
-        df = df.groupby("TYPE").size().reset_index(name='COUNT')
+        df = df.groupby("TYPE", observed=True).size().reset_index(name='COUNT')
         df = df.sort_values(by="COUNT", ascending=True)
         # 画柱状图
         plt.figure(figsize=self.figsize)
@@ -1,3 +1,6 @@
+import numpy as np
+
+from utils import Stats
 from .df import FundStarDF
 
 
@@ -9,31 +12,33 @@ class FundStarSummary:
         self.source_obj = FundStarDF()
         self.df = self.source_obj.df
 
+    @staticmethod
+    def _count_at_least(values):
+        """五星评级数 >= k 的数量, k=1,2,3,4"""
+        stats = Stats(values)
+        return {k: stats.num - int(stats.less(k)) for k in range(1, 5)}
+
     def _statistics(self):
         # 基金数量
         fund_count = self.df.shape[0]
         # 计算星级的平均值（三家评级的中位数）
-        df = self.df
-        df["STAR_MEDIAN"] = self.df[["STAR_SHZQ", "STAR_ZSZQ", "STAR_JAJX"]].fillna(0).median(axis=1).astype(int)
-        df = df.groupby(["STAR_MEDIAN"]).size().reset_index(name="COUNT")
-        # 计算星级的数量
-        star_count = df.set_index("STAR_MEDIAN")["COUNT"].to_dict()
+        stats = Stats(self.df[["STAR_SHZQ", "STAR_ZSZQ", "STAR_JAJX"]].fillna(0).median(axis=1).astype(int))
+        # 计算星级的数量 (只保留出现过的星级)
+        stars = np.arange(stats.lb, stats.ub + 1).astype(int) if stats.num > 0 else np.array([], dtype=int)
+        counts = stats.count(np.append(stars, stats.ub + 1))
+        star_count = {int(k): int(v) for k, v in zip(stars, counts) if v > 0}
         # 计算星级的百分比
         star_percent = { k: round(v / fund_count * 100, 2)
             for k, v in star_count.items() }
         # 五星基金的数量
         # k代表对应评级的机构数量，k=1,2,3,4
-        star5s_fund_count = {
-            k: self.df[self.df["COUNT_5S"] >= k].shape[0] for k in range(1, 5)
-        }
-        # 五星评级的基金经理数量
-        star5s_manager_count = {
-            k: self.df[self.df["COUNT_5S"] >= k]["MANAGER"].nunique() for k in range(1, 5)
-        }
+        star5s_fund_count = self._count_at_least(self.df["COUNT_5S"])
+        # 五星评级的基金经理数量: 按基金经理的最大五星评级数计算
+        star5s_manager_count = self._count_at_least(
+            self.df.groupby("MANAGER", observed=True)["COUNT_5S"].max())
         # 五行基金的基金公司数量
-        star5s_company_count = {
-            k: self.df[self.df["COUNT_5S"] >= k]["COMPANY"].nunique() for k in range(1, 5)
-        }
+        star5s_company_count = self._count_at_least(
+            self.df.groupby("COMPANY", observed=True)["COUNT_5S"].max())
 
         return {
             "fund_count": fund_count,
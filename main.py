@@ -1,6 +1,12 @@
+import sys
+
 from model.model import SimpleFundModel
+from utils import metrics
 
 
 if __name__ == "__main__":
     model = SimpleFundModel(budget=50, unit=5)
     model.run()
+    # 保存运行指标 (数据获取、解析、保存的耗时等), 例如: python main.py metrics.json 或 metrics.prom
+    if len(sys.argv) > 1:
+        metrics.dump(sys.argv[1])
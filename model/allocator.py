@@ -0,0 +1,136 @@
+from abc import ABC, abstractmethod
+
+import numpy as np
+import pandas as pd
+
+from pool.df import FundFactDF
+from utils.logger import logger
+
+
+class Allocator(ABC):
+
+    """ 分配预算的接口 (参考 SimpleFundModel.allocator)
+    allocate(model) 返回 DataFrame, 字段为 CODE (基金代码) 和 BUDGET (投资金额, unit 的整数倍)。
+    子类必须实现 allocate, 否则无法创建实例。
+    """
+
+    @abstractmethod
+    def allocate(self, model):
+        """分配预算
+        :param model: SimpleFundModel
+        :return: DataFrame, 字段为 CODE, BUDGET
+        """
+
+
+class HeuristicAllocator(Allocator):
+
+    """ 默认的分配方法: 按类型权重分配到每种类型, 类型内按收益率区间选择基金
+    (参考 SimpleFundModel.get_type_budget, get_fund_by_type)
+    """
+
+    def allocate(self, model):
+        model.select(model.get_type_budget())
+        return model.fund
+
+
+class OptimizedAllocator(Allocator):
+
+    """ 优化的分配方法: 在集中度约束下, 最大化组合的预期收益率 (RATE 按投资金额加权)
+    说明：每个基金投资整数份 (每份 unit), 总份数为 budget / unit (四舍五入)。约束如下, 比例都相对于总份数:
+    - 每个基金不超过 fund_cap
+    - 每种类型不超过 type_cap (一个比例, 或者 dict: 类型 -> 比例, 没有列出的类型不限制)
+    - 每个基金公司不超过 company_cap (参考 CompanyDF)
+    - 每个基金经理管理的基金合计不超过 manager_cap (参考 ManagerIndex)
+    - 只投资手续费不超过 commission_max 的基金
+    求解方法: 按收益率从高到低, 每个基金投资约束允许的最多份数 (贪心)。
+    只有基金和类型约束时, 贪心的结果是最优的, 所以它的收益率是原问题的上界 (参考 bound)。
+    约束太严格时, 可能有部分预算无法分配。
+    """
+
+    def __init__(self, **kwargs):
+        self.fund_cap = 0.2
+        self.type_cap = 0.4
+        self.company_cap = 0.3
+        self.manager_cap = 0.3
+        self.commission_max = None
+        for k, v in kwargs.items():
+            setattr(self, k, v)
+
+    @staticmethod
+    def _cap(fraction, total):
+        """比例对应的份数, 至少为 1"""
+        return max(1, int(fraction * total + 1e-9))
+
+    def _candidates(self, model):
+        """候选基金: 有收益率、手续费满足条件的基金, 以及它们的基金公司和基金经理"""
+        pool = model.pool.dropna(subset=["RATE"])
+        if self.commission_max is not None:
+            pool = pool[pool.COMMISSION <= self.commission_max]
+        fact = FundFactDF(columns=["CODE", "COMP_ID"]).df.drop_duplicates(subset=["CODE"])
+        pool = pool.merge(fact, on="CODE", how="left")
+        from fundstar.index import get_manager_index
+        pairs = get_manager_index().pairs
+        pairs = pairs[pairs.CODE.isin(pool.CODE)]
+        managers = pairs.groupby("CODE").MANAGER.agg(list)
+        pool["MANAGERS"] = pool.CODE.map(managers)
+        return pool.sort_values(by="RATE", ascending=False, kind="stable").reset_index(drop=True)
+
+    def _solve(self, model, relaxed=False):
+        """贪心求解。relaxed 为 True 时忽略基金公司和基金经理的约束。
+        :return: (候选基金, 每个基金的份数)
+        """
+        df = self._candidates(model)
+        total = round(model.budget / model.unit)
+        fund_cap = self._cap(self.fund_cap, total)
+        if isinstance(self.type_cap, dict):
+            type_left = {t: self._cap(f, total) for t, f in self.type_cap.items()}
+        else:
+            type_left = {t: self._cap(self.type_cap, total) for t in df.TYPE.unique()}
+        company_cap = self._cap(self.company_cap, total)
+        manager_cap = self._cap(self.manager_cap, total)
+        company_left = {}
+        manager_left = {}
+
+        units = np.zeros(len(df), dtype=int)
+        remaining = total
+        for i, (fund_type, company, managers) in enumerate(zip(df.TYPE, df.COMP_ID, df.MANAGERS)):
+            if remaining == 0:
+                break
+            x = min(fund_cap, remaining, type_left.get(fund_type, remaining))
+            if not relaxed:
+                if not pd.isna(company):
+                    x = min(x, company_left.get(company, company_cap))
+                if isinstance(managers, list):
+                    for m in managers:
+                        x = min(x, manager_left.get(m, manager_cap))
+            if x <= 0:
+                continue
+            units[i] = x
+            remaining -= x
+            if fund_type in type_left:
+                type_left[fund_type] -= x
+            if not relaxed:
+                if not pd.isna(company):
+                    company_left[company] = company_left.get(company, company_cap) - x
+                if isinstance(managers, list):
+                    for m in managers:
+                        manager_left[m] = manager_left.get(m, manager_cap) - x
+        if remaining > 0 and not relaxed:
+            logger.warning(f"[Allocate]: unallocated = {remaining * model.unit}")
+        return df, units
+
+    def allocate(self, model):
+        df, units = self._solve(model)
+        selected = units > 0
+        return pd.DataFrame({
+            "CODE": df.CODE.to_numpy()[selected],
+            "BUDGET": units[selected] * model.unit,
+        })
+
+    def bound(self, model):
+        """预期收益率的上界 (单位: %): 只保留基金和类型约束时的最优解。
+        和 SimpleFundModel.summarize 一样按总预算计算, 没有分配的预算收益为 0。
+        """
+        df, units = self._solve(model, relaxed=True)
+        total = round(model.budget / model.unit)
+        return float((units * df.RATE.to_numpy()).sum() / max(total, 1))
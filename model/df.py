@@ -15,14 +15,20 @@ class FundParamDF(DFLoader):
         "PROFIT",  # 平均利润
         "COMMISSION",  # 手续费(单位:%)
     ]
-    expire = 0
+    dtypes = {
+        "CODE": "code",
+        "TYPE": "category",
+    }
+    expire = 30
+    remote = False  # 由其它数据计算得到
+    depends = [FundPoolDF]
 
-    def __init__(self):
+    def __init__(self, **kwargs):
         super().__init__(expire=self.expire,
-                         header=self.header)
+                         header=self.header, **kwargs)
 
     def get(self):
-        df = FundPoolDF().df
+        df = FundPoolDF(file_dir=self.file_dir).df
         df["RATE"] = (df.RATE_1Y + df.RATE_2Y + df.RATE_3Y) / 3
         df["PROFIT"] = df.FUND_VALUE * df.RATE / 100
         df["VALUE"] = df.FUND_VALUE
@@ -40,16 +46,19 @@ class FundTypeParamDF(DFLoader):
         "WEIGHT",  # 权重
         "RATE_WEIGHT",  # 收益率权重
     ]
-    expire = 0
+    expire = 30
+    key = "TYPE"
+    remote = False  # 由其它数据计算得到
+    depends = [FundParamDF]
 
-    def __init__(self):
+    def __init__(self, **kwargs):
         super().__init__(expire=self.expire,
-                         header=self.header)
+                         header=self.header, **kwargs)
 
     def get(self):
-        df = FundParamDF().df
+        df = FundParamDF(file_dir=self.file_dir).df
         # 按基金类型对 VALUE 和 PROFIT 分组求和
-        df = df.groupby("TYPE").agg({'VALUE': 'sum', 'PROFIT': 'sum'}).reset_index()
+        df = df.groupby("TYPE", observed=True).agg({'VALUE': 'sum', 'PROFIT': 'sum'}).reset_index()
         # 计算收益率
         df["RATE"] = df.PROFIT / df.VALUE
         # 计算基金类型的权重
@@ -1,8 +1,11 @@
+import copy
+
 import numpy as np
 import pandas as pd
 
-from model.df import FundTypeParamDF, FundParamDF
+from model.allocator import HeuristicAllocator
 from fundstar.df import FundStarDF
+from model.df import FundTypeParamDF, FundParamDF
 
 
 class SimpleFundModel(object):
@@ -10,12 +13,16 @@ class SimpleFundModel(object):
     def __init__(self, budget:int, unit:int, **kwargs):
         self.budget = budget
         self.unit = unit
+        self.allocator = None  # 分配预算的方法 (参考 model.allocator), 默认为 HeuristicAllocator
+        self.risk = None  # 风险模拟 (参考 model.risk.RiskSimulator), 设置后 summarize 输出收益率的分布
         for k, v in kwargs.items():
             setattr(self, k, v)
         # 候选基金池
         self.pool = FundParamDF().df
         # 结果
         self.fund = None
+        # 选择基金的中间结果 (参考 _sorted_by_type, _select)
+        self._selections = {}
 
     @staticmethod
     def _adjust(fractions):
@@ -23,107 +30,219 @@ class SimpleFundModel(object):
         1. intergers 的和等于 fractions 的和
         2. intergers 的值尽可能接近 fractions 的值
         3. intergers 的值尽可能均匀
+        fractions 是二维数组时, 每一行分别计算。
         """
         fractions = np.array(fractions)
-        target_sum = round(fractions.sum())
+        target_sum = np.round(fractions.sum(axis=-1))
         # 第一步: 向下取整
         integers = np.floor(fractions).astype(int)
         # 第二步: 计算还需要分配的差值
-        remaining = target_sum - integers.sum()
+        remaining = target_sum - integers.sum(axis=-1)
         # 第三步: 计算小数部分
         decimal_parts = fractions - integers
         # 根据小数部分大小排序，取前remaining个最大的值对应的位置加1
-        indices = np.argsort(decimal_parts)[::-1]
-        integers[indices[:int(remaining)]] += 1
+        indices = np.argsort(decimal_parts, axis=-1)[..., ::-1]
+        rank = np.empty_like(indices)
+        np.put_along_axis(rank, indices, np.arange(indices.shape[-1]), axis=-1)
+        integers += rank < np.expand_dims(remaining, -1)
         return integers
-    
+
+    @classmethod
+    def _type_num(cls, weight, budgets, units):
+        """每个投资预算在每种类型上投资的基金份数。
+        :param weight: Series, 每种类型的权重 (参考 FundTypeParamDF)
+        :param budgets: 投资预算的数组
+        :param units: 每份投资金额的数组, 与 budgets 等长
+        :return: 二维数组, 每行一个投资预算, 每列一种类型 (与 weight 的顺序相同)
+        """
+        # 计算被投资基金的数量
+        invest_fund_num = np.asarray(budgets) / np.asarray(units)
+        # 计算每种类型的投资数量 (类型按权重从大到小排列)
+        order = weight.reset_index(drop=True).sort_values(ascending=False).index.to_numpy()
+        invest_type_num = invest_fund_num[:, None] * weight.to_numpy()[order]
+        nums = np.empty(invest_type_num.shape, dtype=int)
+        nums[:, order] = cls._adjust(invest_type_num)
+        return nums
+
     def get_type_budget(self):
         df = FundTypeParamDF().df
-        # 计算被投资基金的数量
-        invest_fund_num = self.budget / self.unit
-        # 计算每种类型的投资数量
-        invest_type_num = invest_fund_num * df.WEIGHT
-        invest_type_num = invest_type_num.sort_values(ascending=False)
-        df["BUDGET"] = self._adjust(invest_type_num) * self.unit
+        df["BUDGET"] = self._type_num(df.WEIGHT, [self.budget], [self.unit])[0] * self.unit
         return df[["TYPE", "BUDGET"]]
 
+    def _sorted_by_type(self, fund_type):
+        """类型为 fund_type 的基金, 按收益率从高到低排序。同一个类型只排序一次。
+        :return: (基金在 pool 中的位置, 收益率, 收益率是否与其它基金相同)
+        """
+        key = ("sorted", fund_type)
+        if key not in self._selections:
+            df = self.pool[self.pool.TYPE == fund_type]
+            df = df.sort_values(by="RATE", ascending=False)
+            self._selections[key] = (
+                self.pool.index.get_indexer(df.index),
+                df.RATE.to_numpy(dtype=float),
+                df.RATE.duplicated(keep=False).to_numpy(),
+            )
+        return self._selections[key]
+
+    def _select(self, fund_type, num):
+        """在类型为 fund_type 的基金中选择 num 份投资 (参考 get_fund_by_type)。同样的参数只计算一次。
+        :return: (基金在 pool 中的位置, 每个基金的份数), 顺序与 get_fund_by_type 的结果相同
+        """
+        key = (fund_type, num)
+        if key in self._selections:
+            return self._selections[key]
+        position, rate, duplicated = self._sorted_by_type(fund_type)
+
+        if len(position) == 0:
+            # 没有这个类型的基金 (例如候选基金池只包含部分类型), 这部分预算不投资
+            position = np.empty(0, dtype=np.int64)
+            count = np.empty(0, dtype=int)
+        elif num >= len(position):
+            # 每个基金 k 份, 收益率最高的 s 个基金多 1 份
+            k = num // len(position)
+            s = int(num % len(position))
+            count = np.full(len(position), k)
+            count[:s] += 1
+        else:
+            # 把收益率分成 num 个区间 (区间编号从 0 开始, 没有收益率的基金为空)
+            bins = pd.cut(rate, bins=num, include_lowest=True, labels=False)
+            valid = ~np.isnan(bins)
+            bins = bins[valid].astype(np.int64)
+            position, rate, duplicated = position[valid], rate[valid], duplicated[valid]
+            # 计算每个区间的基金数量 (只保留有基金的区间)
+            count = np.bincount(bins, minlength=num)
+            observed = np.flatnonzero(count)
+            # 计算每个区间的基金数量占总数的比例, 然后计算每个区间的基金数量
+            weight = (count[observed] / count[observed].sum()) * num
+            quota = np.zeros(num, dtype=np.int64)
+            quota[observed] = self._adjust(weight)
+            # 在每一个区间，选择收益率最高的 quota 个基金 (已经按收益率从高到低排序)
+            order = np.argsort(bins, kind="stable")
+            start = np.concatenate([[0], np.cumsum(count)])
+            rank = np.empty(len(bins), dtype=np.int64)
+            rank[order] = np.arange(len(bins)) - start[bins[order]]
+            # 有相同收益率的区间, 按原来的方式 (sort_values 从高到低, 快速排序) 在区间内重新排序,
+            # 因为排序不稳定, 相同收益率的基金的顺序可能变化
+            tied = order[np.isin(bins[order], bins[duplicated])]
+            for where in np.split(tied, np.flatnonzero(np.diff(bins[tied])) + 1):
+                if len(where) == 0:
+                    continue
+                values = rate[where][::-1]
+                rank[where[(len(where) - 1 - values.argsort(kind="quicksort"))[::-1]]] = np.arange(len(where))
+            selected = rank < quota[bins]
+            # 按区间从低到高排列, 区间内按收益率从高到低排列
+            order = np.lexsort((rank[selected], bins[selected]))
+            position = position[selected][order]
+            count = np.ones(len(position), dtype=int)
+
+        self._selections[key] = (position, count)
+        return position, count
+
     def get_fund_by_type(self, fund_type, budget:int):
         if budget == 0:
             return None
-        df = self.pool[self.pool.TYPE == fund_type]
-        df = df.sort_values(by="RATE", ascending=False)
-        num = int(budget / self.unit)
-
-        if num >= len(df):
-            k = num // len(df)
-            s = int(num % len(df))
-            fund = df[["CODE"]].reset_index()
-            fund["BUDGET"] = k * self.unit
-            if s > 0:
-                fund.loc[0:s-1, "BUDGET"] = (k+1) * self.unit
-        else:
-            # 把收益率分成 num 个区间
-            df["RATE_BIN"] = pd.cut(df.RATE, bins=num, include_lowest=True)
-            # 计算每个区间的基金数量
-            df_bin = df.groupby("RATE_BIN", observed=True).size().reset_index(name="COUNT")
-            # 计算每个区间的基金数量占总数的比例
-            df_bin["PROPORTION"] = df_bin.COUNT / df_bin.COUNT.sum()
-            # 计算每个区间的基金数量
-            weight = (df_bin.PROPORTION * num).tolist()
-            df_bin["NUM"] = self._adjust(weight)
-
-            fund_dfs = []
-            # 在每一个区间，选择对应数量的基金
-            for _, r in df_bin.iterrows():
-                df_bin_fund = df[df.RATE_BIN == r.RATE_BIN].sort_values(by="RATE", ascending=False)
-                fund_selected = df_bin_fund.iloc[:int(r.NUM)]
-                # 添加到结果集合中
-                fund_dfs.append(fund_selected)
-            # 合并结果
-            fund = pd.concat(fund_dfs).reset_index(drop=True)
-            fund["BUDGET"] = self.unit
-
-        return fund[["CODE", "BUDGET"]]
+        position, count = self._select(fund_type, int(budget / self.unit))
+        return pd.DataFrame({
+            "CODE": self.pool.CODE.to_numpy()[position],
+            "BUDGET": count * self.unit,
+        })
 
     def select(self, df:pd.DataFrame):
         df = df.sort_values(by="BUDGET", ascending=False)
         fund_dfs = []
-        for _, row in df.iterrows():
-            if row.BUDGET == 0:
+        for fund_type, budget in zip(df.TYPE, df.BUDGET):
+            if budget == 0:
                 continue
-            fund_selected = self.get_fund_by_type(row.TYPE, row.BUDGET)
+            fund_selected = self.get_fund_by_type(fund_type, budget)
             fund_dfs.append(fund_selected)
         self.fund = pd.concat(fund_dfs)
 
 
     def format(self):
         fund = self.pool.merge(self.fund, on="CODE").reset_index(drop=True)
-        df = FundStarDF().df[["CODE", "NAME", "MANAGER", "COMPANY", "COUNT_5S"]]
+        # 基金名称等信息来自基金评级
+        df = FundStarDF(columns=["CODE", "NAME", "MANAGER", "COMPANY", "COUNT_5S"]).df
         self.fund = fund.merge(df, on="CODE").reset_index(drop=True)
 
     def summarize(self):
-        profit_exp = 0
-        for _, row in self.fund.iterrows():
-            profit_exp += row.BUDGET * row.RATE / 100
+        profit_exp = (self.fund.BUDGET * self.fund.RATE / 100).sum(skipna=False)
         rate_exp = profit_exp / self.budget * 100
 
         print(f"==== Summary ====")
         print(f"|-- 投资预算 = {self.budget} 万元")
         print(f"|-- 预期收益率 =  {rate_exp:.2f}%,  预期收益 = {profit_exp:.2f} 万元")
+        if self.risk is not None:
+            risk = self.risk.simulate(self.fund).iloc[0]
+            quantiles = ", ".join(f"{q * 100:g}% = {risk[f'Q_{q * 100:g}']:.2f}%" for q in self.risk.quantiles)
+            print(f"|-- 收益率分位数: {quantiles}")
+            print(f"|-- 亏损概率 = {risk.LOSS_PROB * 100:.2f}%,  "
+                  f"期望损失 (最差 {self.risk.alpha * 100:g}%) = {risk.ES:.2f}%")
         print(f"|-- 基金数量 = {int(self.budget / self.unit)}")
 
-        type_count = self.fund.groupby("TYPE").size().reset_index(name="COUNT")
+        type_count = self.fund.groupby("TYPE", observed=True).size().reset_index(name="COUNT")
         for _, row in type_count.iterrows():
             print(f"|-- [{row.TYPE}]: 数量 = {int(row.COUNT)}")
 
         print(f"|-- 基金列表")
         for _, row in self.fund.iterrows():
-            print(f"|-- [{row.CODE:06}][{row.NAME}][{row.MANAGER}][{row.TYPE}]"
+            print(f"|-- [{row.CODE}][{row.NAME}][{row.MANAGER}][{row.TYPE}]"
                   f"[手续费: {row.COMMISSION:.2f}%][五星评级数: {row.COUNT_5S}]")
 
     def run(self):
-        budget = self.get_type_budget()
-        self.select(budget)
+        allocator = self.allocator or HeuristicAllocator()
+        self.fund = allocator.allocate(self)
         self.format()
         self.summarize()
         return self.fund
+
+    @classmethod
+    def run_many(cls, budgets, units, verbose=False, **kwargs):
+        """批量计算多个投资预算的基金组合。基金池、类型参数和基金信息只加载一次,
+        同样的 (类型, 份数) 只选择一次基金。使用默认的分配方法 (HeuristicAllocator)。
+        :param budgets: 投资预算的列表, 或者一个数
+        :param units: 每份投资的金额, 一个数或者与 budgets 等长的列表
+        :param verbose: 是否打印每个组合的汇总 (参考 summarize)
+        :return: DataFrame, 每个组合的每个基金一行, 字段与 run 的结果相同, 另外加上：
+            - REQUEST: 组合的编号 (在 budgets 中的位置)
+        """
+        model = cls(budget=None, unit=None, **kwargs)
+        budgets, units = np.broadcast_arrays(np.atleast_1d(budgets), np.atleast_1d(units))
+        df = FundTypeParamDF().df
+        nums = cls._type_num(df.WEIGHT, budgets, units)
+
+        # 每种类型的每个份数选择一次基金, 然后分配给份数相同的组合
+        positions, counts, requests = [], [], []
+        for j, fund_type in enumerate(df.TYPE):
+            col = nums[:, j]
+            for num in np.unique(col[col > 0]):
+                position, count = model._select(fund_type, int(num))
+                request = np.flatnonzero(col == num)
+                positions.append(np.tile(position, len(request)))
+                counts.append(np.tile(count, len(request)))
+                requests.append(np.repeat(request, len(position)))
+        position = np.concatenate(positions or [np.empty(0, dtype=int)])
+        count = np.concatenate(counts or [np.empty(0, dtype=int)])
+        request = np.concatenate(requests or [np.empty(0, dtype=int)])
+        # 每个组合内的顺序与 format 相同 (基金池的顺序)
+        order = np.lexsort((position, request))
+        position, count, request = position[order], count[order], request[order]
+
+        # 基金信息 (参考 format)
+        info = FundStarDF(columns=["CODE", "NAME", "MANAGER", "COMPANY", "COUNT_5S"]).df
+        pool = model.pool.reset_index(drop=True)
+        found = pool.CODE.isin(info.CODE).to_numpy()
+        keep = found[position]
+        position, count, request = position[keep], count[keep], request[keep]
+        fund = pool.iloc[position].reset_index(drop=True)
+        fund.insert(0, "REQUEST", request)
+        fund["BUDGET"] = count * units[request]
+        fund = fund.merge(info, on="CODE", how="left")
+
+        if verbose:
+            start = np.searchsorted(request, np.arange(len(budgets) + 1))
+            for i in range(len(budgets)):
+                m = copy.copy(model)
+                m.budget, m.unit = budgets[i], units[i]
+                m.fund = fund.iloc[start[i]: start[i + 1]].drop(columns=["REQUEST"]).reset_index(drop=True)
+                m.summarize()
+        return fund
@@ -0,0 +1,290 @@
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from fundrate.df import OpenFundRateDF
+from pool.df import FundFactDF
+
+
+class RiskSimulator:
+
+    """ 基金组合的蒙特卡洛风险模拟
+    说明：模拟每个基金一年的收益率 (单位: %), 然后计算组合收益率的分布。
+    收益率的场景有三种生成方式 (method):
+    - normal: 正态分布。均值和标准差来自基金的 RATE_1Y, RATE_2Y, RATE_3Y (都折算成年化收益率),
+      基金之间的相关性由市场因子 (所有基金) 和类型因子 (同类型的基金) 决定 (参考 market_corr, type_corr)。
+      注意：只有三个 (而且相互重叠的) 样本, 标准差只是非常粗略的估计
+    - bootstrap: 每条路径随机抽取一个时间跨度 (1Y, 2Y, 3Y), 所有基金使用同一个跨度的年化收益率
+    - history: 从累计净值的历史快照 (OpenFundRateDF 的历史数据) 计算每期的收益率,
+      每条路径随机抽取若干期 (合计约一年) 并累乘
+    - auto: 有足够的历史快照时使用 history, 否则使用 normal
+    路径分块计算, 每块的随机数由 seed 派生; 各块的统计量按块的顺序合并, 所以结果与进程数无关。
+    组合收益率的分布用直方图累计 (每个区间记录数量和总和), 内存占用与路径数量无关,
+    分位数的误差不超过一个区间的宽度。
+    用法:
+        simulator = RiskSimulator(n_paths=1000000, seed=0, max_workers=4)
+        report = simulator.simulate(SimpleFundModel.run_many(budgets, units))
+    """
+
+    def __init__(self, **kwargs):
+        self.method = "auto"  # 场景的生成方式: auto, normal, bootstrap, history
+        self.n_paths = 100000  # 路径数量
+        self.chunk_size = 20000  # 每块的路径数量, 内存占用约为 chunk_size * (基金数量 + 组合数量) * 8 字节
+        self.seed = None  # 随机数种子
+        self.quantiles = [0.01, 0.05, 0.5, 0.95, 0.99]  # 收益率的分位数
+        self.alpha = 0.05  # 期望损失 (ES) 的尾部比例
+        self.market_corr = 0.3  # normal: 不同类型的基金收益率的相关系数
+        self.type_corr = 0.6  # normal: 同类型的基金收益率的相关系数 (>= market_corr)
+        self.min_history = 4  # history: 至少需要的历史快照数量
+        self.horizon = 365  # history: 模拟的时间长度 (单位: 天)
+        self.bins = 2000  # 直方图的区间数量
+        self.max_workers = None  # 进程数, None 或 1 时在当前进程中计算
+        for k, v in kwargs.items():
+            setattr(self, k, v)
+
+    @staticmethod
+    def _portfolios(fund):
+        """组合的权重矩阵。
+        :param fund: DataFrame, 字段包括 CODE, BUDGET, 以及可选的 REQUEST (参考 SimpleFundModel.run_many)
+        :return: (组合编号, 每个组合的总预算, 基金代码, 权重矩阵 (组合数量 * 基金数量, 每行的和为 1))
+        """
+        if "REQUEST" in fund.columns:
+            request = fund.REQUEST.to_numpy()
+        else:
+            request = np.zeros(len(fund), dtype=int)
+        requests, row = np.unique(request, return_inverse=True)
+        codes, col = np.unique(fund.CODE.astype(str).to_numpy(), return_inverse=True)
+        budget = np.zeros((len(requests), len(codes)))
+        np.add.at(budget, (row, col), fund.BUDGET.to_numpy(dtype=float))
+        total = budget.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            weight = budget / total[:, None]
+        return requests, total, codes, np.nan_to_num(weight)
+
+    @staticmethod
+    def _rates(codes):
+        """基金的年化收益率 (单位: %) 和类型, 顺序与 codes 相同
+        说明：RATE_2Y, RATE_3Y 是累计收益率, 按 (1 + r / 100) ^ (1 / 年数) - 1 折算成年化收益率。
+        :return: (年化收益率 (基金数量 * 3, 依次为 1Y, 2Y, 3Y), 类型)
+        """
+        df = FundFactDF(columns=["CODE", "TYPE", "RATE_1Y", "RATE_2Y", "RATE_3Y"]).df
+        df = df.drop_duplicates(subset=["CODE"]).set_index("CODE").reindex(codes)
+        rates = df[["RATE_1Y", "RATE_2Y", "RATE_3Y"]].to_numpy(dtype=float)
+        years = np.array([1, 2, 3])
+        # 亏损 100% 以上的数据无法折算, 当作缺失
+        with np.errstate(invalid="ignore"):
+            rates = (np.power(1 + rates / 100, 1 / years) - 1) * 100
+        types = df.TYPE.astype(str).to_numpy()
+        return rates, types
+
+    def _history(self, codes, mean):
+        """累计净值的每期对数收益率 (期数 * 基金数量) 和每期的天数。历史快照不够时返回 None。
+        :param mean: 基金的年收益率 (单位: %), 用于填充缺失的收益率
+        """
+        history = OpenFundRateDF(lazy=True)._history()
+        dates = history.dates()
+        if len(dates) < self.min_history:
+            return None
+        navs = []
+        for date in dates:
+            df = history.load(date).drop_duplicates(subset=["CODE"]).set_index("CODE")
+            navs.append(pd.to_numeric(df.RATE_ACC, errors="coerce").reindex(codes).to_numpy(dtype=float))
+        navs = np.array(navs)
+        days = np.diff(pd.to_datetime(dates, format="%Y%m%d")).astype("timedelta64[D]").astype(float)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            returns = np.log(navs[1:] / navs[:-1])
+        missing = ~np.isfinite(returns)
+        # 缺失的收益率: 用基金自己的每期平均收益率填充; 没有历史数据的基金, 按年收益率折算
+        count = (~missing).sum(axis=0)
+        fill = np.where(missing, 0, returns).sum(axis=0) / np.maximum(count, 1)
+        expected = np.log1p(mean / 100)[None, :] * days[:, None] / 365
+        fill = np.where(count > 0, fill[None, :], expected)
+        return np.where(missing, fill, returns), days
+
+    def _scenario(self, codes):
+        """生成场景需要的参数 (可以传给子进程)"""
+        rates, types = self._rates(codes)
+        # 每个基金的均值和标准差 (忽略缺失的收益率)
+        valid = ~np.isnan(rates)
+        count = valid.sum(axis=1)
+        mean = np.where(valid, rates, 0).sum(axis=1) / np.maximum(count, 1)
+        square = np.where(valid, (rates - mean[:, None]) ** 2, 0).sum(axis=1)
+        std = np.sqrt(square / np.maximum(count - 1, 1))
+        mean[count == 0] = np.nan
+        std[count < 2] = np.nan
+        # 没有收益率的基金, 使用同类型基金的中位数
+        frame = pd.DataFrame({"TYPE": types, "MEAN": mean, "STD": std})
+        for col in ["MEAN", "STD"]:
+            frame[col] = frame[col].fillna(frame.groupby("TYPE")[col].transform("median"))
+            frame[col] = frame[col].fillna(frame[col].median()).fillna(0)
+        mean, std = frame.MEAN.to_numpy(), frame.STD.to_numpy()
+
+        method = self.method
+        history = None
+        if method in ("auto", "history"):
+            history = self._history(codes, mean)
+            if history is None and method == "history":
+                raise ValueError(f"not enough history, min_history = {self.min_history}")
+            method = "history" if history is not None else "normal"
+        scenario = {"method": method, "mean": mean}
+        if method == "normal":
+            type_codes, type_index = np.unique(types, return_inverse=True)
+            scenario.update(std=std, type_index=type_index, n_types=len(type_codes),
+                            market=math.sqrt(self.market_corr),
+                            type=math.sqrt(max(self.type_corr - self.market_corr, 0)),
+                            noise=math.sqrt(max(1 - self.type_corr, 0)))
+        elif method == "bootstrap":
+            scenario["rates"] = np.where(np.isnan(rates), mean[:, None], rates).T
+        elif method == "history":
+            returns, days = history
+            scenario.update(returns=returns, draws=max(1, round(self.horizon / days.mean())))
+        else:
+            raise ValueError(f"unknown method = {method}")
+        return scenario
+
+    @staticmethod
+    def _draw(scenario, rng, n):
+        """生成 n 条路径的基金收益率 (n * 基金数量, 单位: %)"""
+        method = scenario["method"]
+        mean = scenario["mean"]
+        if method == "normal":
+            z = scenario["market"] * rng.standard_normal((n, 1))
+            z = z + scenario["type"] * rng.standard_normal((n, scenario["n_types"]))[:, scenario["type_index"]]
+            z += scenario["noise"] * rng.standard_normal((n, len(mean)))
+            return mean + scenario["std"] * z
+        if method == "bootstrap":
+            rates = scenario["rates"]
+            return rates[rng.integers(0, len(rates), n)]
+        returns = scenario["returns"]
+        total = np.zeros((n, returns.shape[1]))
+        for _ in range(scenario["draws"]):
+            total += returns[rng.integers(0, len(returns), n)]
+        return np.expm1(total) * 100
+
+    def simulate(self, fund):
+        """模拟组合收益率的分布。
+        :param fund: DataFrame, 字段包括 CODE, BUDGET, 以及可选的 REQUEST (多个组合, 参考 SimpleFundModel.run_many)
+        :return: DataFrame, 每个组合一行, 字段如下：
+            - REQUEST: 组合编号 (fund 中有 REQUEST 时)
+            - BUDGET: 组合的总预算
+            - RATE_MEAN: 收益率的均值 (单位: %)
+            - RATE_STD: 收益率的标准差 (单位: %)
+            - Q_<分位数>: 收益率的分位数 (单位: %), 例如 Q_5 是 5% 分位数
+            - LOSS_PROB: 亏损 (收益率 < 0) 的概率
+            - ES: 期望损失, 最差的 alpha 比例路径的平均收益率 (单位: %)
+        """
+        requests, total, codes, weight = self._portfolios(fund)
+        scenario = self._scenario(codes)
+        seeds = np.random.SeedSequence(self.seed).spawn(1 + math.ceil(self.n_paths / self.chunk_size))
+
+        # 先用一块路径确定每个组合的直方图范围
+        pilot = self._draw(scenario, np.random.default_rng(seeds[0]), min(self.chunk_size, 10000)) @ weight.T
+        low, high = pilot.min(axis=0), pilot.max(axis=0)
+        pad = np.maximum(high - low, 1e-6)
+        state = {"scenario": scenario, "weight": weight, "low": low - pad, "high": high + pad, "bins": self.bins}
+
+        sizes = [min(self.chunk_size, self.n_paths - i) for i in range(0, self.n_paths, self.chunk_size)]
+        chunks = list(zip(seeds[1:], sizes))
+        if not self.max_workers or self.max_workers <= 1 or len(chunks) <= 1:
+            _init_worker(state)
+            result = _merge(map(_run_chunk, chunks))
+        else:
+            workers = min(self.max_workers, len(chunks))
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(state,)) as executor:
+                # map 按块的顺序返回结果, 求和的顺序与在当前进程中计算相同
+                result = _merge(executor.map(_run_chunk, chunks))
+        return self._report(requests, total, state, result, "REQUEST" in fund.columns)
+
+    def _report(self, requests, total, state, result, has_request):
+        n = result["n"]
+        counts, sums = result["counts"], result["sums"]
+        width = (state["high"] - state["low"]) / state["bins"]
+        # 每个区间的上下边界 (第一个和最后一个区间是超出范围的部分)
+        lower = state["low"][:, None] + width[:, None] * np.arange(-1, state["bins"] + 1)[None, :]
+        upper = lower + width[:, None]
+        lower[:, 0], upper[:, 0] = np.minimum(result["min"], state["low"]), state["low"]
+        lower[:, -1], upper[:, -1] = state["high"], np.maximum(result["max"], state["high"])
+        cumulative = np.cumsum(counts, axis=1)
+
+        def quantile(q):
+            target = q * n
+            j = np.minimum((cumulative < target).sum(axis=1), counts.shape[1] - 1)
+            rows = np.arange(len(j))
+            before = cumulative[rows, j] - counts[rows, j]
+            fraction = np.clip((target - before) / np.maximum(counts[rows, j], 1), 0, 1)
+            return lower[rows, j] + fraction * (upper[rows, j] - lower[rows, j])
+
+        df = pd.DataFrame({"REQUEST": requests}) if has_request else pd.DataFrame(index=range(len(requests)))
+        df["BUDGET"] = total
+        mean = result["sum"] / n
+        df["RATE_MEAN"] = mean
+        df["RATE_STD"] = np.sqrt(np.maximum(result["sumsq"] / n - mean ** 2, 0))
+        for q in self.quantiles:
+            df[f"Q_{q * 100:g}"] = quantile(q)
+        df["LOSS_PROB"] = result["loss"] / n
+        # 期望损失: 最差的 k 条路径的平均值, 边界区间按比例计算
+        k = max(self.alpha * n, 1)
+        j = np.minimum((cumulative < k).sum(axis=1), counts.shape[1] - 1)
+        rows = np.arange(len(j))
+        before = cumulative[rows, j] - counts[rows, j]
+        tail = np.cumsum(sums, axis=1)[rows, j] - sums[rows, j]
+        fraction = np.clip((k - before) / np.maximum(counts[rows, j], 1), 0, 1)
+        df["ES"] = (tail + fraction * sums[rows, j]) / k
+        return df
+
+
+_worker = None  # 子进程中的模拟参数 (参考 RiskSimulator.simulate)
+
+
+def _init_worker(state):
+    global _worker
+    _worker = state
+
+
+def _run_chunk(chunk):
+    """计算一块路径, 返回统计量"""
+    state = _worker
+    weight, low, high, bins = state["weight"], state["low"], state["high"], state["bins"]
+    n_port = len(weight)
+    width = (high - low) / bins
+    offset = np.arange(n_port) * (bins + 2)
+    result = {
+        "n": 0,
+        "counts": np.zeros(n_port * (bins + 2)),
+        "sums": np.zeros(n_port * (bins + 2)),
+        "sum": np.zeros(n_port),
+        "sumsq": np.zeros(n_port),
+        "loss": np.zeros(n_port),
+        "min": np.full(n_port, np.inf),
+        "max": np.full(n_port, -np.inf),
+    }
+    seed, size = chunk
+    rng = np.random.default_rng(seed)
+    rate = RiskSimulator._draw(state["scenario"], rng, size) @ weight.T  # 路径数量 * 组合数量
+    # 区间编号: 0 是低于范围的部分, bins + 1 是高于范围的部分
+    index = np.clip(np.floor((rate - low) / width).astype(np.int64) + 1, 0, bins + 1) + offset
+    result["counts"] += np.bincount(index.ravel(), minlength=len(result["counts"]))
+    result["sums"] += np.bincount(index.ravel(), weights=rate.ravel(), minlength=len(result["sums"]))
+    result["n"] += size
+    result["sum"] += rate.sum(axis=0)
+    result["sumsq"] += (rate ** 2).sum(axis=0)
+    result["loss"] += (rate < 0).sum(axis=0)
+    result["min"] = np.minimum(result["min"], rate.min(axis=0))
+    result["max"] = np.maximum(result["max"], rate.max(axis=0))
+    result["counts"] = result["counts"].reshape(n_port, bins + 2)
+    result["sums"] = result["sums"].reshape(n_port, bins + 2)
+    return result
+
+
+def _merge(results):
+    """按顺序合并各块的统计量 (results 可以是迭代器)"""
+    results = iter(results)
+    merged = dict(next(results))
+    for r in results:
+        for key in ["n", "counts", "sums", "sum", "sumsq", "loss"]:
+            merged[key] = merged[key] + r[key]
+        merged["min"] = np.minimum(merged["min"], r["min"])
+        merged["max"] = np.maximum(merged["max"], r["max"])
+    return merged
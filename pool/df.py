@@ -1,7 +1,13 @@
 import re
+from concurrent.futures import ThreadPoolExecutor
 
 import akshare as ak
+import numpy as np
+import pandas as pd
 
+from fundmgr.df import FundManagerDF
+from fundrate.df import OpenFundRateDF
+from fundstar.df import FundStarDF
 from utils.dfloader import DFLoader
 from .pipline import PoolPipline
 
@@ -28,12 +34,20 @@ class FundPurchaseDF(DFLoader):
         "BUY_MAX_D",  # 单日累计申购最高金额 (单位: 元)
         "COMMISSION",  # 手续费 (单位: %)
     ]
+    dtypes = {
+        "CODE": "code",
+        "TYPE": "category",
+        "NAV_10K": "float32",
+        "NAV_10K_DATE": "category",
+        "STATUS_BUY": "category",
+        "STATUS_SELL": "category",
+    }
 
     expire = 30
 
-    def __init__(self):
+    def __init__(self, **kwargs):
         super().__init__(expire=self.expire,
-                         header=self.header)
+                         header=self.header, **kwargs)
 
     def get(self):
         self.df = ak.fund_purchase_em()
@@ -56,12 +70,16 @@ class CompanyFundValueDF(DFLoader):
         "UPDATE_DATE",  # 更新日期
         "COMP",  # 基金公司短名称
     ]
+    dtypes = {
+        "UPDATE_DATE": "category",
+    }
 
     expire = 30
+    key = ["COMPANY", "UPDATE_DATE"]
 
-    def __init__(self):
+    def __init__(self, **kwargs):
         super().__init__(expire=self.expire,
-                         header=self.header)
+                         header=self.header, **kwargs)
 
     def get(self):
         self.df = ak.fund_aum_em()
@@ -69,7 +87,14 @@ class CompanyFundValueDF(DFLoader):
 
     def _add_comp(self):
         # 给基金公司添加短名称
-        company = self.df["基金公司"]
+        self.df["COMP"] = self.short_name(self.df["基金公司"])
+
+    @staticmethod
+    def short_name(company):
+        """基金公司的短名称, 例如 易方达基金管理有限公司 -> 易方达
+        :param company: Series, 基金公司的全称 (或者简称)
+        """
+        # 后缀按顺序匹配, 较长的后缀在前面
         suffixes = [
             "基金管理股份有限公司",
             "基金管理有限责任公司",
@@ -81,37 +106,207 @@ class CompanyFundValueDF(DFLoader):
             "证券有限公司",
             "股份有限公司",
         ]
+        # 如果存在括号, 则删除括号以及括号内的文本
+        name = company.astype("string").str.replace(r"\(.*?\)", "", regex=True).str.strip()
+        # 去掉后缀并移除两端空格
+        pattern = "(?:" + "|".join(map(re.escape, suffixes)) + ")$"
+        return name.str.replace(pattern, "", regex=True).str.strip().astype(object)
+
+
+class CompanyDF(DFLoader):
+
+    """ 基金公司表: 每个基金公司一行
+    说明：FundStarDF 的基金公司是简称, CompanyFundValueDF 的基金公司是全称 (并且同一个公司可能有多行),
+    这里把它们统一成基金公司编号 COMP_ID, 管理规模取最新的一行。
+    所有按基金公司的合并都通过这张表 (参考 ids)。
+    """
+
+    remark = "基金公司"
+    header = [
+        "COMP_ID",  # 基金公司编号
+        "COMP",  # 基金公司短名称
+        "COMPANY",  # 基金公司全称 (只在评级中出现的公司为空)
+        "BUILT_DATE",  # 成立日期
+        "FUND_VALUE",  # 全部管理规模 (最新)
+        "FUND_COUNT",  # 全部基金数量
+        "MANAGER_COUNT",  # 全部经理数量
+        "UPDATE_DATE",  # 更新日期
+    ]
+    dtypes = {
+        "COMP_ID": "int32",
+        "UPDATE_DATE": "category",
+    }
+
+    expire = 30
+    remote = False  # 由其它数据计算得到
+    key = "COMP_ID"
+    depends = [CompanyFundValueDF, FundStarDF]
+
+    def __init__(self, **kwargs):
+        super().__init__(expire=self.expire,
+                         header=self.header, **kwargs)
+
+    def get(self):
+        value = CompanyFundValueDF(file_dir=self.file_dir).df.copy()
+        star = FundStarDF(columns=["COMPANY"], file_dir=self.file_dir).df
+        # 同一个公司有多行时, 取最新的一行 (更新日期的格式为 MM-DD)
+        value["COMP"] = CompanyFundValueDF.short_name(value.COMPANY)
+        value["DATE"] = pd.to_datetime(value.UPDATE_DATE.astype(str), format="%m-%d")
+        value = value.sort_values("DATE", kind="stable").groupby("COMP").last().reset_index()
+        # 只在评级中出现的公司
+        comp = CompanyFundValueDF.short_name(pd.Series(star.COMPANY.dropna().unique()))
+        others = pd.Index(comp.unique()).difference(pd.Index(value.COMP)).sort_values()
+        df = pd.concat([value, pd.DataFrame({"COMP": others})], ignore_index=True)
+        df["COMP_ID"] = np.arange(len(df), dtype="int32")
+        self.df = df[self.header]
+
+    def ids(self, names):
+        """基金公司的名称 (简称或全称) 对应的编号。找不到的公司为空。
+        :param names: Series, 基金公司名称
+        :return: Series (Int32), 与 names 的索引相同
+        """
+        comp = self.df.set_index("COMP").COMP_ID
+        if isinstance(names.dtype, pd.CategoricalDtype):
+            # 分类数据只需要转换每个类别
+            categories = CompanyFundValueDF.short_name(pd.Series(names.cat.categories)).map(comp)
+            codes = names.cat.codes.to_numpy()
+            ids = pd.array(categories.to_numpy()[codes], dtype="Int32")
+            ids[codes < 0] = pd.NA
+            return pd.Series(ids, index=names.index)
+        return CompanyFundValueDF.short_name(names).map(comp).astype("Int32")
+
+
+class FundFactDF(DFLoader):
+
+    """ 基金事实表: 按基金代码合并申购状态、收益率、评级和基金公司规模, 每个基金一行
+    说明：上游数据 (depends) 的快照变化时重新计算, 否则直接读取缓存。
+    基金池的过滤条件都可以表示成这张表上的布尔条件, 不需要反复合并数据。
+    """
+
+    remark = "基金事实表"
+    header = [
+        "CODE",  # 代码
+        "NAME",  # 简称
+        "TYPE",  # 类型
+        "STATUS_BUY",  # 申购状态
+        "STATUS_SELL",  # 赎回状态
+        "BUY_MIN",  # 单次申购最低金额 (单位: 元)
+        "BUY_MAX_D",  # 单日累计申购最高金额 (单位: 元)
+        "COMMISSION",  # 手续费 (单位: %)
+        "RATE_1Y",  # 近1年收益率 (单位: %)
+        "RATE_2Y",  # 近2年收益率 (单位: %)
+        "RATE_3Y",  # 近3年收益率 (单位: %)
+        "RANK_1Y",  # 近1年收益率排名 (从 1 开始)
+        "RANK_2Y",  # 近2年收益率排名
+        "RANK_3Y",  # 近3年收益率排名
+        "N_1Y",  # 有近1年收益率的基金数量
+        "N_2Y",  # 有近2年收益率的基金数量
+        "N_3Y",  # 有近3年收益率的基金数量
+        "MANAGER",  # 基金经理
+        "COMPANY",  # 基金公司（缩写）
+        "COMP_ID",  # 基金公司编号 (参考 CompanyDF)
+        "COUNT_5S",  # 5星评级数
+        "STAR_AVG",  # 评级平均分 (向下取整)
+        "STAR",  # 评级中位数
+        "FUND_VALUE",  # 基金公司管理规模
+    ]
+    dtypes = {
+        "CODE": "code",
+        "TYPE": "category",
+        "STATUS_BUY": "category",
+        "STATUS_SELL": "category",
+        "RATE_1Y": "float32",
+        "RATE_2Y": "float32",
+        "RATE_3Y": "float32",
+        "RANK_1Y": "Int32",
+        "RANK_2Y": "Int32",
+        "RANK_3Y": "Int32",
+        "N_1Y": "int32",
+        "N_2Y": "int32",
+        "N_3Y": "int32",
+        "COMPANY": "category",
+        "COMP_ID": "Int32",
+        "COUNT_5S": "Int16",
+        "STAR_AVG": "float32",
+        "STAR": "Int8",
+    }
+
+    expire = 30
+    remote = False  # 由其它数据计算得到
+    depends = [FundPurchaseDF, OpenFundRateDF, FundStarDF, CompanyDF]
+
+    def __init__(self, **kwargs):
+        super().__init__(expire=self.expire,
+                         header=self.header, **kwargs)
+
+    @staticmethod
+    def _rank(rate, col):
+        """按收益率从高到低排名, 排序方式与 PoolPipline.filter_rate 取前 k 个相同"""
+        df = rate[["CODE", col]].dropna(subset=[col])
+        df = df.sort_values(by=col, ascending=False)
+        rank = pd.Series(np.arange(1, len(df) + 1), index=df.index)
+        # 同一个基金有多行时, 取最好的排名
+        return rank.groupby(df.CODE).min(), len(df)
+
+    def get(self):
+        # 上游数据相互独立, 并发加载 (数据过期时, 获取数据的时间可以重叠)
+        loaders = [
+            FundPurchaseDF(columns=["CODE", "NAME", "TYPE", "STATUS_BUY", "STATUS_SELL",
+                                    "BUY_MIN", "BUY_MAX_D", "COMMISSION"], file_dir=self.file_dir),
+            OpenFundRateDF(columns=["CODE", "RATE_1Y", "RATE_2Y", "RATE_3Y"], file_dir=self.file_dir),
+            FundStarDF(columns=["CODE", "NAME", "MANAGER", "COMPANY", "COUNT_5S",
+                                "STAR_SHZQ", "STAR_ZSZQ", "STAR_JAJX"], file_dir=self.file_dir),
+            CompanyDF(columns=["COMP_ID", "COMP", "FUND_VALUE"], file_dir=self.file_dir),
+        ]
+        with ThreadPoolExecutor(max_workers=len(loaders)) as executor:
+            purchase, rate, star, company = executor.map(lambda loader: loader.df, loaders)
+
+        # 所有基金, 申购状态表中的基金在前 (保持原来的顺序)
+        df = purchase.drop_duplicates(subset=["CODE"])
+        others = pd.Index(rate.CODE).union(pd.Index(star.CODE)).difference(pd.Index(df.CODE))
+        df = pd.concat([df, pd.DataFrame({"CODE": others})], ignore_index=True)
 
-        def remove_suffix(text, suffix_list):
-            # 遍历所有前缀并检查是否以该前缀结尾
-            for suffix in suffix_list:
-                if text.endswith(suffix):
-                    # 去掉后缀并移除两端空格
-                    return text[:-len(suffix)].strip()
-            return text  # 如果没有匹配的后缀，则返回原文本
+        # 收益率和排名
+        df = df.merge(rate.drop_duplicates(subset=["CODE"]), on="CODE", how="left")
+        for span in ["1Y", "2Y", "3Y"]:
+            rank, n = self._rank(rate, f"RATE_{span}")
+            df[f"RANK_{span}"] = df.CODE.map(rank)
+            df[f"N_{span}"] = n
 
-        short_names = []
-        for name in company:
-            # 如果存在括号, 则删除括号以及括号内的文本
-            name = re.sub(r'\(.*?\)', '', name).strip()
-            # 去掉后缀
-            short_name = remove_suffix(name, suffixes)
-            short_names.append(short_name)
+        # 评级
+        star = star.drop_duplicates(subset=["CODE"]).rename(columns={"NAME": "STAR_NAME"})
+        stars = star[["STAR_SHZQ", "STAR_ZSZQ", "STAR_JAJX"]].fillna(0)
+        star["STAR_AVG"] = (stars["STAR_SHZQ"] + stars["STAR_ZSZQ"] + stars["STAR_JAJX"]) // 3
+        star["STAR"] = stars.median(axis=1).astype(int)
+        df = df.merge(star.drop(columns=["STAR_SHZQ", "STAR_ZSZQ", "STAR_JAJX"]), on="CODE", how="left")
+        df["NAME"] = df.NAME.fillna(df.pop("STAR_NAME"))
 
-        self.df["COMP"] = short_names
+        # 基金公司规模 (每个公司一行, 不会增加基金的行数)
+        df["COMP_ID"] = loaders[-1].ids(df.COMPANY.astype("category"))
+        df["FUND_VALUE"] = df.COMP_ID.map(company.set_index("COMP_ID").FUND_VALUE).astype("float64")
+
+        self.df = df[self.header]
 
 
 class FundPoolDF(DFLoader):
 
     remark = "候选基金池"
     header = None
+    dtypes = {
+        "CODE": "code",
+        "TYPE": "category",
+    }
+
     expire = 30
+    remote = False  # 由其它数据计算得到
+    # 基金池的过滤步骤读取的数据 (参考 PoolPipline._sources)
+    depends = [FundFactDF, CompanyDF, FundManagerDF, FundStarDF]
 
-    def __init__(self):
+    def __init__(self, **kwargs):
         super().__init__(expire=self.expire,
-                         header=self.header)
+                         header=self.header, **kwargs)
 
     def get(self):
-        self.df = PoolPipline().process().df
+        self.df = PoolPipline(file_dir=self.file_dir).process().df
         # 去重
         self.df = self.df.drop_duplicates(subset=["CODE"])
@@ -1,39 +1,163 @@
+import copy
+import hashlib
+import json
+import os
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import reduce
+from pathlib import Path
+
+import numpy as np
 import pandas as pd
 import akshare as ak
 
-from utils import logger
+from utils import logger, metrics
 
 
 class PoolPipline:
 
+    """ 基金池的筛选流程
+    说明：先加载基金事实表 (FundFactDF), 然后依次执行过滤步骤 stages, 最后整理字段 (format)。
+    每个过滤步骤只在候选基金上取交集, 结果与执行顺序无关, 所以可以按代价和选择率安排顺序:
+    先执行代价低、过滤掉的基金多的步骤; 候选基金为空时, 跳过剩下的步骤 (不再加载数据)。
+    过滤步骤的结果缓存在磁盘上 (memo), 键为输入的候选基金、参数和数据源快照的哈希,
+    只修改后面步骤的参数时, 前面的步骤直接使用缓存。
+    参数可以通过 kwargs、字典或者 JSON 文件配置 (参考 from_config), 例如:
+        PoolPipline.from_config({"head1": 10, "stages": ["filter_status", "filter_rate"]})
+    """
+
+    # 过滤步骤: 名称 -> (说明, 代价, 选择率)。代价和选择率是估计值, 只用于安排执行顺序
+    stage_hints = {
+        "filter_status": ("申购状态", 1, 0.35),
+        "filter_rate": ("收益率", 1, 0.6),
+        "filter_star": ("基金评级", 1, 0.3),
+        "filter_company": ("基金公司", 3, 0.3),
+        "filter_manager": ("基金经理", 5, 0.5),
+    }
+    # 过滤步骤使用的参数
+    stage_params = {
+        "filter_status": ["buy_lb", "buy_d_ub", "com_lb"],
+        "filter_rate": ["head1", "head2", "head3"],
+        "filter_star": [],
+        "filter_company": ["age_lb", "value_head", "rate_head"],
+        "filter_manager": ["exp_lb", "exp_ub", "rate_max_top"],
+    }
+    memo_version = 3  # 过滤步骤的逻辑变化时加 1, 旧的缓存自动失效
+
     def __init__(self, **kwargs):
+        # 申购状态 (参考 filter_status)
+        self.buy_lb = 10_000
+        self.buy_d_ub = 100_000
+        self.com_lb = 0.15
+        # 收益率 (参考 filter_rate)
+        self.head1 = 20
+        self.head2 = 30
+        self.head3 = 40
+        # 基金公司 (参考 filter_company)
+        self.age_lb = 5
+        self.value_head = 60
+        self.rate_head = 50
+        # 基金经理 (参考 filter_manager)
+        self.exp_lb = 5
+        self.exp_ub = 20
+        self.rate_max_top = 50
+        # 执行计划
+        self.stages = list(self.stage_hints.keys())  # 需要执行的过滤步骤
+        self.reorder = True  # 是否按代价和选择率安排顺序; 为 False 时按 stages 的顺序执行
+        self.explain = False  # 记录每个步骤的耗时、行数、每个条件过滤掉的行数和使用的数据源
+        self.profile = False  # 在 explain 的基础上, 记录每个步骤的内存峰值 (tracemalloc, 较慢)
+        self.file_dir = Path("./data")  # 数据目录, 所有数据源都从这里加载
+        self.memo = True  # 是否缓存过滤步骤的结果
+        self.memo_dir = None  # 缓存目录, 默认为 file_dir/cache/pool
+        self.memo_expire = 30  # 缓存文件保留天数
+        self.concurrent = None  # 并发执行过滤步骤: None - 依次执行, "thread" - 线程池, "process" - 进程池
+        self.max_workers = None  # 并发执行时的最大线程数 (进程数), 默认为过滤步骤的数量
         for k, v in kwargs.items():
             setattr(self, k, v)
+        self.file_dir = Path(self.file_dir)
+        if self.memo_dir is None:
+            self.memo_dir = self.file_dir / "cache" / "pool"
         self.df = None
+        self.stats = []  # explain / profile 的结果, 每个步骤一条记录 (参考 report)
+        self._stage = None  # 正在执行的步骤的记录
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        """根据配置创建筛选流程。
+        :param config: dict, 或者 JSON 文件路径。键为参数名称, 例如 head1, stages
+        """
+        if isinstance(config, (str, Path)):
+            with open(config, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        unknown = [k for k in config if not hasattr(cls(), k)]
+        assert len(unknown) == 0, f"Unknown parameters: {unknown}"
+        return cls(**{**config, **kwargs})
+
+    def plan(self):
+        """过滤步骤的执行顺序。
+        按 (1 - 选择率) / 代价 从大到小排序, 即单位代价过滤掉的基金最多的步骤先执行。
+        """
+        for stage in self.stages:
+            assert stage in self.stage_hints, f"stage must be in {list(self.stage_hints.keys())}"
+        if not self.reorder:
+            return list(self.stages)
+
+        def rank(stage):
+            _, cost, selectivity = self.stage_hints[stage]
+            return -(1 - selectivity) / cost
+
+        return sorted(self.stages, key=rank)
+
+    def load(self):
+        """加载基金事实表 (参考 FundFactDF), 所有的过滤都在这张表上进行"""
+        from .df import FundFactDF
+        self.df = FundFactDF(file_dir=self.file_dir).df
+
+    def _filter(self, df, predicates, how="and"):
+        """按条件过滤 df, 结果保存到 self.df。
+        :param predicates: dict, 条件名称 -> 布尔 Series
+        :param how: "and" - 满足所有条件, "or" - 满足任一条件
+        explain 模式下, 记录每个条件单独过滤掉的行数。
+        """
+        masks = list(predicates.values())
+        mask = reduce(lambda a, b: a & b, masks) if how == "and" else reduce(lambda a, b: a | b, masks)
+        if self._stage is not None:
+            self._stage["ROWS_IN"] = len(df)
+            self._stage["PREDICATES"] = {name: int((~m).sum()) for name, m in predicates.items()}
+        self.df = df[mask]
 
     def filter_status(self):
         """
         根据购买状态过滤。满足如下条件:
         1. 申购状态 = "开放申购"
         2. 赎回状态 = "开放赎回"
-        3. 购买起点 <= buy_lb = 10_000
-        4. 日累计限定金额 >= buy_d_ub = 100_000
-        5. 手续费 <= com_lb = 0.15
+        3. 购买起点 <= buy_lb (默认 10_000)
+        4. 日累计限定金额 >= buy_d_ub (默认 100_000)
+        5. 手续费 <= com_lb (默认 0.15)
         """
-        buy_lb = 10_000
-        buy_d_ub = 100_000
-        com_lb = 0.15
-
-        from .df import FundPurchaseDF
-        df = FundPurchaseDF().df
-
-        self.df = df[
-            (df["STATUS_BUY"] == "开放申购") &
-            (df["STATUS_SELL"] == "开放赎回") &
-            (df["BUY_MIN"] <= buy_lb) &
-            (df["BUY_MAX_D"] >= buy_d_ub) &
-            (df["COMMISSION"] <= com_lb)
-        ]
+        buy_lb = self.buy_lb
+        buy_d_ub = self.buy_d_ub
+        com_lb = self.com_lb
+
+        df = self.df
+
+        self._filter(df, {
+            "STATUS_BUY == 开放申购": df["STATUS_BUY"] == "开放申购",
+            "STATUS_SELL == 开放赎回": df["STATUS_SELL"] == "开放赎回",
+            f"BUY_MIN <= {buy_lb}": df["BUY_MIN"] <= buy_lb,
+            f"BUY_MAX_D >= {buy_d_ub}": df["BUY_MAX_D"] >= buy_d_ub,
+            f"COMMISSION <= {com_lb}": df["COMMISSION"] <= com_lb,
+        })
+
+    @staticmethod
+    def _top(rank, n, head):
+        """排名在前 head % 以内: rank <= k, k = int(head / 100 * n)
+        说明：k 必须用 float64 计算, 和按收益率排序后取前 k 个的结果相同 (float32 在部分 head 下会多取一个)。
+        没有排名的基金, 结果为 False。
+        """
+        k = np.floor(head / 100 * n.astype("float64"))
+        return (rank <= k).fillna(False).astype(bool)
 
     def filter_rate(self):
         """ 按收益率过滤。按如下方式过滤：
@@ -41,39 +165,19 @@ class PoolPipline:
         2. 按2年收益率排名, 取排名前 head2 (单位：%) 基金
         3. 按1年收益率排名, 取排名前 head1 (单位：%) 基金
         """
-        head3 = 40
-        head2 = 30
-        head1 = 20
-
-        from fundrate.df import OpenFundRateDF
-        df = OpenFundRateDF().df
-
-        # 近3年收益排序
-        df3 = df[["CODE", "RATE_3Y"]].dropna(subset=["RATE_3Y"])
-        df3 = df3.sort_values(by="RATE_3Y", ascending=False)
-        # 取前 head3 %
-        k = int((head3 / 100) * len(df3))
-        df3 = df3[:k]
-
-        # 近2年收益排序
-        df2 = df[["CODE", "RATE_2Y"]].dropna(subset=["RATE_2Y"])
-        df2 = df2.sort_values(by="RATE_2Y", ascending=False)
-        # 取前 head2 %
-        k = int((head2 / 100) * len(df2))
-        df2 = df2[:k]
-
-        # 近1年收益排序
-        df1 = df[["CODE", "RATE_1Y"]].dropna(subset=["RATE_1Y"])
-        df1 = df1.sort_values(by="RATE_1Y", ascending=False)
-        # 取前 head1 %
-        k = int((head1 / 100) * len(df1))
-        df1 = df1[:k]
-
-        # df1, d2, d3 取并集
-        df = pd.concat([df1, df2, df3]).drop_duplicates()
-
-        # self.df 与 df 取交集
-        self.df = self.df[self.df.CODE.isin(df.CODE)]
+        head3 = self.head3
+        head2 = self.head2
+        head1 = self.head1
+
+        df = self.df
+        # 收益率排名在前 k 个以内, k = 有收益率的基金数量 * head %
+        # 注意: 没有收益率的基金, 排名为空, 比较的结果为 False
+        # 三个条件取并集
+        self._filter(df, {
+            f"RATE_1Y top {head1}%": self._top(df.RANK_1Y, df.N_1Y, head1),
+            f"RATE_2Y top {head2}%": self._top(df.RANK_2Y, df.N_2Y, head2),
+            f"RATE_3Y top {head3}%": self._top(df.RANK_3Y, df.N_3Y, head3),
+        }, how="or")
 
     def filter_star(self):
         """按评级过滤。按如下方式过滤：
@@ -81,99 +185,89 @@ class PoolPipline:
         2. 向下取整: STAR = floor(STAR)
         2. 过滤掉平均分 STAR <= 2 的基金
         """
-        from fundstar.df import FundStarDF
-        df = FundStarDF().df[["CODE", "STAR_SHZQ", "STAR_ZSZQ", "STAR_JAJX"]].fillna(0)
-        df["STAR"] = (df["STAR_SHZQ"] + df["STAR_ZSZQ"] + df["STAR_JAJX"]) // 3
-        df = df[df.STAR > 2]
-        # self.df 与 df 按 CODE 取交集
-        self.df = self.df[self.df.CODE.isin(df.CODE)]
+        # STAR_AVG 即向下取整的平均分 (参考 FundFactDF)
+        self._filter(self.df, {"STAR_AVG > 2": self.df.STAR_AVG > 2})
 
     def filter_company(self):
         """按公司过滤。按如下方式过滤：
-        1. 公司的年龄 >= age_lb = 5 年
-        2. 管理规模排名前 value_head (%) 的基金公司
-        3. 业绩排名前 rate_head (%) 的基金公司
+        1. 公司的年龄 >= age_lb (默认 5) 年
+        2. 管理规模排名前 value_head (默认 60%) 的基金公司
+        3. 业绩排名前 rate_head (默认 50%) 的基金公司
             业绩定义如下：公司业绩 = 公司管理的基金近3年的收益率 RATE_3Y 的中位数
         """
-        age_lb = 5
-        value_head = 60
-        rate_head = 50
-
-        from .df import CompanyFundValueDF
-        df = CompanyFundValueDF().df
-
-        # 1. 按年龄筛选
-        # 计算公司年龄
-        df['AGE'] = (pd.to_datetime('today') - pd.to_datetime(df['BUILT_DATE'], format='%Y-%m-%d')).dt.days // 365
-        # 筛选年龄 >= age_lb 的行
-        df = df[df.AGE >= age_lb]
+        value_head = self.value_head
+        rate_head = self.rate_head
 
-        # 2. 按管理规模筛选
-        # 将 UPDATE_DATE 列转换为日期格式（MM-DD）
-        df['DATE'] = pd.to_datetime(df['UPDATE_DATE'], format='%m-%d')
-        # 按 COMP 分组并获取最新日期对应的 FUND_VALUE
-        latest_fund_value = df.sort_values('DATE').groupby('COMP').last().reset_index()
+        # 1. 按年龄筛选, 2. 按管理规模筛选
+        df = self._company_by_value(self.age_lb)
         # 筛选管理规模前 head % 的基金公司
-        df = latest_fund_value[['COMP', 'FUND_VALUE']].dropna(subset=["FUND_VALUE"])
-        df = df.sort_values(by="FUND_VALUE", ascending=False)
         k = int((value_head / 100) * len(df))
-        comp = df[0: k].COMP
+        comp = df[0: k].COMP_ID
 
         # 3. 按业绩筛选
-        from fundrate.df import OpenFundRateDF
-        from fundstar.df import FundStarDF
-        df = OpenFundRateDF().df
-        df = df.merge(FundStarDF().df[["CODE", "COMPANY"]], on="CODE")
-        df = df[df.COMPANY.isin(comp)]  # 跟前面两个条件的结果取交集
-        # 计算业绩
-        df = df[["CODE", "RATE_3Y", "COMPANY"]].dropna(subset=["RATE_3Y"])
-        df = df.groupby("COMPANY", as_index=False).agg({"RATE_3Y": "median"})
+        df = self._company_rate()
+        df = df[df.COMP_ID.isin(comp)]  # 跟前面两个条件的结果取交集
         df = df.sort_values(by="RATE_3Y", ascending=False)
         k = int((rate_head / 100) * len(df))
-        comp = df[0: k].COMPANY
+        comp = df[0: k].COMP_ID
 
-        # 获取基金公司对应的基金代码
-        from fundstar.df import FundStarDF
-        df = FundStarDF().df
-        fund = df[df.COMPANY.isin(comp)].CODE
         # 保存结果
-        self.df = self.df[self.df.CODE.isin(fund)]
+        self._filter(self.df, {f"COMPANY in top {len(comp)}": self.df.COMP_ID.isin(comp)})
 
-    def filter_manager(self):
-        """按基金经理过滤。满足如下条件：
-        1. 从业时间在 [exp_lb, exp_ub] 之间（单位：年）
-        2. 历史最佳业绩前 rate_max_top （百分比）的基金经理
-        """
-        exp_lb = 5
-        exp_ub = 20
-        rate_max_top = 50
+    def _company_by_value(self, age_lb):
+        """年龄 >= age_lb 的基金公司, 按最新的管理规模从大到小排序"""
+        from .df import CompanyDF
+        # 每个公司一行, 管理规模是最新的 (参考 CompanyDF)
+        df = CompanyDF(columns=["COMP_ID", "COMP", "BUILT_DATE", "FUND_VALUE"], file_dir=self.file_dir).df
+
+        # 1. 按年龄筛选
+        # 计算公司年龄
+        age = (pd.to_datetime('today') - pd.to_datetime(df['BUILT_DATE'], format='%Y-%m-%d')).dt.days // 365
+        # 筛选年龄 >= age_lb 的行
+        df = df[age >= age_lb]
+
+        # 2. 按管理规模排序
+        df = df[['COMP_ID', 'COMP', 'FUND_VALUE']].dropna(subset=["FUND_VALUE"])
+        return df.sort_values(by="FUND_VALUE", ascending=False)
 
+    def _company_rate(self):
+        """基金公司的业绩: 公司管理的基金近3年的收益率 RATE_3Y 的中位数"""
+        from .df import FundFactDF
+        df = FundFactDF(columns=["CODE", "RATE_3Y", "COMP_ID"], file_dir=self.file_dir).df
+        df = df[["CODE", "RATE_3Y", "COMP_ID"]].dropna(subset=["RATE_3Y", "COMP_ID"])
+        return df.groupby("COMP_ID", as_index=False).agg({"RATE_3Y": "median"})
+
+    def _manager_by_exp(self, exp_lb, exp_ub):
+        """从业时间在 [exp_lb, exp_ub] 之间的基金经理, 以及他们的历史最佳业绩"""
         from fundmgr.df import FundManagerDF
-        manager = FundManagerDF().df
+        manager = FundManagerDF(columns=["NAME", "EXP", "RATE_MAX"], file_dir=self.file_dir).df
         # 1. 从业时间
         manager = manager[
             (manager["EXP"] >= exp_lb * 365) &
             (manager["EXP"] <= exp_ub * 365)
         ]
-
         # 2. 基金历史最佳业绩
-        manager_by_rate = manager.groupby("NAME", as_index=False).agg({"RATE_MAX": "max"})
+        return manager.groupby("NAME", as_index=False, observed=True).agg({"RATE_MAX": "max"})
+
+    def filter_manager(self):
+        """按基金经理过滤。满足如下条件：
+        1. 从业时间在 [exp_lb, exp_ub] (默认 [5, 20]) 之间（单位：年）
+        2. 历史最佳业绩前 rate_max_top (默认 50%) 的基金经理
+        """
+        rate_max_top = self.rate_max_top
+
+        # 1. 从业时间, 2. 基金历史最佳业绩
+        manager_by_rate = self._manager_by_exp(self.exp_lb, self.exp_ub)
         manager_by_rate.sort_values(by="RATE_MAX", ascending=False)
         k = int((rate_max_top / 100) * len(manager_by_rate))
         manager_by_rate = manager_by_rate[:k]
-        manager = manager[manager.NAME.isin(manager_by_rate.NAME)]
-        managers_to_keep = set(manager.NAME.tolist())
+        managers_to_keep = set(manager_by_rate.NAME.tolist())
 
         # 获取基金经理对应的基金代码
-        from fundstar.df import FundStarDF
-        df = FundStarDF().df
-        fund_codes = []
-        for _, row in df.iterrows():
-            managers = row.MANAGER.strip('\"').split(',')
-            if set(managers) & managers_to_keep:
-                fund_codes.append(row.CODE)
+        from fundstar.index import get_manager_index
+        fund_codes = get_manager_index(self.file_dir).funds(managers_to_keep)
 
-        self.df = self.df[self.df.CODE.isin(fund_codes)]
+        self._filter(self.df, {f"MANAGER in top {len(managers_to_keep)}": self.df.CODE.isin(fund_codes)})
 
     def format(self):
         """
@@ -191,33 +285,209 @@ class PoolPipline:
         - RATE_3Y: 近3年收益率 (单位：%)
         """
 
-        df = self.df[["CODE", "NAME", "TYPE", "COMMISSION"]]
-        from fundstar.df import FundStarDF
-        df = df.merge(FundStarDF().df[["CODE", "MANAGER", "COMPANY"]], on="CODE")
-        df.rename(columns={'COMPANY': 'COMP'}, inplace=True)
-        star = FundStarDF().df[["STAR_SHZQ", "STAR_ZSZQ", "STAR_JAJX"]].fillna(0).median(axis=1).astype(int)
-        df["STAR"] = star
+        # 事实表中已经包含所有字段, 不需要再合并
+        df = self.df[["CODE", "NAME", "TYPE", "COMMISSION", "MANAGER", "COMPANY",
+                      "STAR", "FUND_VALUE", "RATE_1Y", "RATE_2Y", "RATE_3Y"]]
+        self.df = df.rename(columns={"COMPANY": "COMP"}).reset_index(drop=True)
 
-        from .df import CompanyFundValueDF
-        df = df.merge(CompanyFundValueDF().df[["COMP", "FUND_VALUE"]], on="COMP")
+    @staticmethod
+    def _sources(stage):
+        """过滤步骤读取的数据源"""
+        from fundmgr.df import FundManagerDF
+        from fundstar.df import FundStarDF
+        from .df import CompanyDF, FundFactDF
+        sources = {
+            "filter_company": [CompanyDF],
+            "filter_manager": [FundManagerDF, FundStarDF],
+        }
+        # 候选基金都来自事实表
+        return [FundFactDF, *sources.get(stage, [])]
+
+    def _memo_key(self, stage, candidates):
+        """过滤步骤结果的缓存键。如果有数据源没有快照或已经过期, 返回 None。
+        :param candidates: 输入的候选基金 (事实表的行号) 的哈希
+        """
+        snapshots = {}
+        for cls in self._sources(stage):
+            loader = cls(lazy=True, file_dir=self.file_dir)
+            entry = loader.get_cache_entry()
+            if entry is None or loader.is_expired():
+                return None
+            snapshots[cls.__name__] = entry["content_hash"]
+        params = {k: getattr(self, k) for k in self.stage_params[stage]}
+        if stage == "filter_company":
+            # 公司年龄按当天日期计算
+            params["today"] = time.strftime("%Y%m%d", time.localtime())
+        key = [self.memo_version, stage, params, snapshots, candidates]
+        return hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def _execute(self, stage):
+        """执行步骤。过滤步骤优先使用缓存的结果, 结果保存为事实表的行号。"""
+        if not self.memo or stage not in self.stage_hints:
+            getattr(self, stage)()
+            return
+        candidates = hashlib.sha1(self.df.index.to_numpy(dtype="int64").tobytes()).hexdigest()
+        key = self._memo_key(stage, candidates)
+        if key is not None:
+            path = self.memo_dir / f"{key}.npy"
+            try:
+                index = np.load(path)
+                self.df = self.df.loc[index]
+                if self._stage is not None:
+                    self._stage["MEMO"] = "hit"
+                return
+            except (OSError, ValueError):
+                pass
+        getattr(self, stage)()
+        if self._stage is not None:
+            self._stage["MEMO"] = "miss"
+        # 执行过程中数据源可能被更新, 重新计算缓存键
+        key = self._memo_key(stage, candidates)
+        if key is None:
+            return
+        self.memo_dir.mkdir(parents=True, exist_ok=True)
+        path = self.memo_dir / f"{key}.npy"
+        tmp = self.memo_dir / f".{key}.{os.getpid()}.tmp.npy"
+        np.save(tmp, self.df.index.to_numpy(dtype="int64"))
+        os.replace(tmp, path)
+
+    def _remove_expired_memo(self):
+        """删除过期的缓存文件"""
+        if not self.memo_dir.exists():
+            return
+        cutoff = time.time() - self.memo_expire * 24 * 60 * 60
+        for path in self.memo_dir.glob("*.npy"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except OSError:
+                pass
+
+    def _run(self, stage):
+        """执行步骤 stage (方法名)。explain / profile 模式下记录执行情况。"""
+        if not (self.explain or self.profile):
+            self._execute(stage)
+            return
+        self._stage = {
+            "STAGE": stage,
+            "ROWS_IN": None if self.df is None else len(self.df),
+            "PREDICATES": {},
+        }
+        before = metrics.get()
+        if self.profile:
+            tracemalloc.reset_peak()
+            memory = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            self._execute(stage)
+        finally:
+            stats, self._stage = self._stage, None
+        stats["SECONDS"] = time.perf_counter() - start
+        if self.profile:
+            stats["MEM_PEAK_MB"] = (tracemalloc.get_traced_memory()[1] - memory) / 2 ** 20
+        stats["ROWS_OUT"] = len(self.df)
+        stats["SELECTIVITY"] = None if not stats["ROWS_IN"] else stats["ROWS_OUT"] / stats["ROWS_IN"]
+        stats["LOADERS"] = self._loaders_touched(before, metrics.get())
+        self.stats.append(stats)
+
+    @staticmethod
+    def _loaders_touched(before, after):
+        """两次指标之间加载过的数据源: 数据源 -> 缓存命中情况 (hit, miss, stale)"""
+        loaders = {}
+        for name, m in after.items():
+            b = before.get(name, {})
+            changed = {k: m.get(k, 0) - b.get(k, 0) for k in ["cache_hit", "cache_miss", "cache_stale"]}
+            if changed["cache_miss"] > 0:
+                loaders[name] = "miss"
+            elif changed["cache_stale"] > 0:
+                loaders[name] = "stale"
+            elif changed["cache_hit"] > 0:
+                loaders[name] = "hit"
+        return loaders
+
+    def report(self):
+        """explain / profile 的结果 (DataFrame), 每个步骤一行。字段如下：
+        - STAGE: 步骤
+        - SECONDS: 耗时 (单位: 秒)
+        - ROWS_IN: 输入行数
+        - ROWS_OUT: 输出行数
+        - SELECTIVITY: ROWS_OUT / ROWS_IN
+        - PREDICATES: 每个条件单独过滤掉的行数
+        - LOADERS: 使用的数据源以及缓存命中情况
+        - MEMO: 过滤步骤的结果是否来自缓存 (hit, miss)
+        - MEM_PEAK_MB: 内存峰值增量 (单位: MB), 只有 profile 模式才有
+        """
+        columns = ["STAGE", "SECONDS", "ROWS_IN", "ROWS_OUT", "SELECTIVITY", "PREDICATES", "LOADERS", "MEMO"]
+        if self.profile:
+            columns.append("MEM_PEAK_MB")
+        return pd.DataFrame(self.stats, columns=columns)
 
-        from fundrate.df import OpenFundRateDF
-        df = df.merge(OpenFundRateDF().df[["CODE", "RATE_1Y", "RATE_2Y", "RATE_3Y"]], on="CODE")
-        self.df = df
+    def report_json(self):
+        """explain / profile 的结果 (JSON)"""
+        return json.dumps(self.stats, indent=2, ensure_ascii=False)
 
     def process(self):
+        self.stats = []
+        if self.memo:
+            self._remove_expired_memo()
+        tracing = self.profile and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        try:
+            self._process()
+        finally:
+            if tracing:
+                tracemalloc.stop()
+        return self
+
+    def allowed(self, stage):
+        """在整张事实表上执行过滤步骤 stage, 返回通过过滤的基金 (事实表的行号) 和执行记录。
+        说明：过滤步骤的结果与其它步骤无关, 可以并发执行 (参考 concurrent)。
+        """
+        from .df import FundFactDF
+        # 先加载步骤自己的数据源, 与事实表的加载重叠
+        for cls in self._sources(stage)[1:]:
+            cls(lazy=False, file_dir=self.file_dir)
+        pipline = copy.copy(self)
+        pipline.stats = []
+        pipline._stage = None
+        pipline.df = FundFactDF(file_dir=self.file_dir).df
+        pipline._run(stage)
+        return pipline.df.index.to_numpy(), pipline.stats
+
+    def _process_concurrent(self):
+        """并发执行所有的过滤步骤 (包括加载数据), 然后取交集。结果与依次执行相同。"""
+        stages = self.plan()
+        executor = {"thread": ThreadPoolExecutor, "process": ProcessPoolExecutor}[self.concurrent]
+        with executor(max_workers=self.max_workers or len(stages)) as pool:
+            futures = [pool.submit(_allowed, self, stage) for stage in stages]
+            self._run("load")
+            for stage, future in zip(stages, futures):
+                index, stats = future.result()
+                self.stats.extend(stats)
+                self.df = self.df[self.df.index.isin(index)]
+                logger.info(f"[Filter]: by = '{self.stage_hints[stage][0]}', count = {len(self.df)}")
+        # 基金信息汇总
+        self._run("format")
+
+    def _process(self):
+        if self.concurrent:
+            self._process_concurrent()
+            return
         # 基金筛选流程
-        self.filter_status()  # 可申购的基金
-        logger.info(f"[Filter]: by = '申购状态', count = {len(self.df)}")
-        self.filter_rate()  # 过滤掉业绩靠后的基金
-        logger.info(f"[Filter]: by = '收益率', count = {len(self.df)}")
-        self.filter_star()  # 过滤掉评级低的基金
-        logger.info(f"[Filter]: by = '基金评级', count = {len(self.df)}")
-        self.filter_company()  # 过滤掉公司管理规模靠后的基金
-        logger.info(f"[Filter]: by = '基金公司', count = {len(self.df)}")
-        self.filter_manager()  # 过滤不满足条件的基金经理（基金）
-        logger.info(f"[Filter]: by = '基金经理', count = {len(self.df)}")
+        self._run("load")
+        for stage in self.plan():
+            by = self.stage_hints[stage][0]
+            if len(self.df) == 0:
+                # 候选基金为空, 后面的步骤不会改变结果
+                logger.info(f"[Filter]: by = '{by}', skip")
+                continue
+            self._run(stage)
+            logger.info(f"[Filter]: by = '{by}', count = {len(self.df)}")
         # 基金信息汇总
-        self.format()
+        self._run("format")
+
 
-        return self
\ No newline at end of file
+def _allowed(pipline, stage):
+    # 进程池只能执行模块级的函数
+    return pipline.allowed(stage)
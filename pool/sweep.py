@@ -0,0 +1,167 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .pipline import PoolPipline
+
+
+class _SweepPipline(PoolPipline):
+
+    """ 参数扫描用的筛选流程
+    说明：每个过滤步骤都在整张事实表上执行, 返回通过过滤的基金 (布尔数组)。
+    与参数无关的中间结果 (公司规模排序、公司业绩、基金经理业绩) 只计算一次。
+    """
+
+    def __init__(self, **kwargs):
+        # 每个过滤步骤都在整张事实表上执行, 默认不缓存结果
+        kwargs.setdefault("memo", False)
+        super().__init__(**kwargs)
+        self._cache = {}
+
+    def _cached(self, key, fn, *args):
+        if key not in self._cache:
+            self._cache[key] = fn(*args)
+        return self._cache[key]
+
+    def _company_by_value(self, age_lb):
+        return self._cached(("company_by_value", age_lb), super()._company_by_value, age_lb)
+
+    def _company_rate(self):
+        return self._cached(("company_rate",), super()._company_rate)
+
+    def _manager_by_exp(self, exp_lb, exp_ub):
+        return self._cached(("manager_by_exp", exp_lb, exp_ub), super()._manager_by_exp, exp_lb, exp_ub)
+
+    def fact(self):
+        from .df import FundFactDF
+        return self._cached(("fact",), lambda: FundFactDF(file_dir=self.file_dir).df)
+
+    def mask(self, stage, params):
+        """参数为 params 时, 事实表中通过过滤步骤 stage 的基金"""
+        fact = self.fact()
+        for k, v in params.items():
+            setattr(self, k, v)
+        self.df = fact
+        getattr(self, stage)()
+        return fact.index.isin(self.df.index)
+
+
+_worker = None  # 子进程中的 _SweepPipline
+
+
+def _init_worker(base):
+    global _worker
+    _worker = _SweepPipline(**base)
+
+
+def _run_tasks(tasks):
+    """子进程: 计算一批 (步骤, 参数) 的过滤结果, 按位压缩后返回"""
+    return [np.packbits(_worker.mask(stage, params)) for stage, params in tasks]
+
+
+def grid(params):
+    """参数网格。
+    :param params: dict, 参数名称 -> 取值列表, 例如 {"head1": [10, 20], "age_lb": [3, 5]}
+    :return: 参数组合的列表
+    """
+    names = list(params.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*params.values())]
+
+
+def sample(params, n, seed=None):
+    """从参数网格中随机抽取 n 个参数组合 (每个参数独立均匀抽取, 可能重复)"""
+    rng = np.random.default_rng(seed)
+    columns = {name: rng.choice(len(values), size=n) for name, values in params.items()}
+    return [{name: params[name][columns[name][i]] for name in params} for i in range(n)]
+
+
+def sweep(configs, max_workers=None, chunk_size=256, **kwargs):
+    """参数扫描: 计算每个参数组合下基金池的大小、类型分布和平均收益率。
+    说明：各个过滤步骤的结果只取决于自己的参数, 所以每个步骤只对不同的参数取值计算一次,
+    然后对每个参数组合, 把各个步骤的结果 (布尔数组) 取交集。
+    :param configs: 参数组合的列表 (参考 grid, sample), 参数名称必须在 PoolPipline.stage_params 中
+    :param max_workers: 进程数, 默认为 CPU 数量; 为 1 时在当前进程中计算
+    :param chunk_size: 每个进程任务包含的 (步骤, 参数) 数量
+    :param kwargs: 其它参数, 例如 stages (参考 PoolPipline)
+    :return: DataFrame, 每个参数组合一行, 字段如下：
+        - 参数: 每个扫描的参数一列
+        - SIZE: 基金池的基金数量
+        - RATE: 平均收益率 (RATE_1Y, RATE_2Y, RATE_3Y 的平均值, 参考 FundParamDF)
+        - N_<类型>: 每种类型的基金数量
+    """
+    params = {k for names in PoolPipline.stage_params.values() for k in names}
+    unknown = list(dict.fromkeys(k for c in configs for k in c if k not in params))
+    assert len(unknown) == 0, f"Unknown parameters: {unknown}"
+    base = _SweepPipline(**kwargs)
+    fact = base.fact()
+    stages = [stage for stage in base.stage_hints if stage in base.stages]
+
+    # 每个步骤不同的参数取值
+    keys = {}  # 步骤 -> [参数取值, ...]
+    config_ids = {}  # 步骤 -> 每个参数组合对应的参数取值编号
+    for stage in stages:
+        names = base.stage_params[stage]
+        values = [tuple(c.get(k, getattr(base, k)) for k in names) for c in configs]
+        unique = list(dict.fromkeys(values))
+        keys[stage] = unique
+        position = {v: i for i, v in enumerate(unique)}
+        config_ids[stage] = np.array([position[v] for v in values], dtype=np.int64)
+    tasks = [(stage, dict(zip(base.stage_params[stage], v))) for stage in stages for v in keys[stage]]
+
+    # 计算每个步骤、每个参数取值的过滤结果
+    n = len(fact)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    chunks = [tasks[i: i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+    if max_workers <= 1 or len(chunks) <= 1:
+        packed = [np.packbits(base.mask(stage, params)) for stage, params in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(chunks)),
+                                 initializer=_init_worker, initargs=(kwargs,)) as executor:
+            packed = [m for result in executor.map(_run_tasks, chunks) for m in result]
+    masks = {}
+    i = 0
+    for stage in stages:
+        count = len(keys[stage])
+        masks[stage] = np.unpackbits(np.stack(packed[i: i + count]), axis=1, count=n).astype(bool)
+        i += count
+
+    # 每个参数组合: 各个步骤的结果取交集, 然后统计
+    rate = ((fact.RATE_1Y + fact.RATE_2Y + fact.RATE_3Y) / 3).to_numpy(dtype=np.float64)
+    rate_valid = ~np.isnan(rate)
+    rate = np.where(rate_valid, rate, 0)
+    types = fact.TYPE.astype("category")
+    onehot = np.zeros((n, len(types.cat.categories)), dtype=np.float32)
+    codes = types.cat.codes.to_numpy()
+    onehot[codes >= 0, codes[codes >= 0]] = 1
+
+    size = np.empty(len(configs), dtype=np.int64)
+    rate_sum = np.empty(len(configs))
+    rate_count = np.empty(len(configs))
+    type_count = np.empty((len(configs), onehot.shape[1]), dtype=np.int64)
+    rate_valid = rate_valid.astype(np.float64)
+    # 分批计算, 控制内存占用
+    batch = max(1, 2 ** 23 // max(n, 1))
+    for start in range(0, len(configs), batch):
+        end = min(start + batch, len(configs))
+        selected = np.ones((end - start, n), dtype=bool)
+        for stage in stages:
+            selected &= masks[stage][config_ids[stage][start:end]]
+        size[start:end] = selected.sum(axis=1)
+        selected = selected.astype(np.float32)
+        rate_sum[start:end] = selected @ rate
+        rate_count[start:end] = selected @ rate_valid
+        type_count[start:end] = np.rint(selected @ onehot)
+
+    names = list(dict.fromkeys(k for stage in stages for k in base.stage_params[stage]
+                               if any(k in c for c in configs)))
+    result = pd.DataFrame(configs, columns=names)
+    result["SIZE"] = size
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result["RATE"] = rate_sum / rate_count
+    for j, name in enumerate(types.cat.categories):
+        result[f"N_{name}"] = type_count[:, j]
+    return result
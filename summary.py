@@ -50,6 +50,20 @@ class RunFundStar:
         f.summarize()
 
 
+class RunMemory:
+
+    @staticmethod
+    def summarize():
+        import fundrate.df
+        import fundstar.df
+        import fundmgr.df
+        import pool.df
+        from utils.schema import memory_report
+        from utils.warmer import get_loaders
+        # 各数据源转换列类型前后的内存占用
+        print(memory_report(get_loaders()))
+
+
 if __name__ == "__main__":
 
     # RunFundManager.summarize()
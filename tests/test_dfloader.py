@@ -0,0 +1,52 @@
+import shutil
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+from utils.dfloader import DFLoader
+
+
+class RefreshDF(DFLoader):
+
+    """ 测试用的数据源: get 等待 release 之后返回数据目录的名称 """
+
+    remote = False
+    release = threading.Event()
+
+    def get(self):
+        self.release.wait(10)
+        self.df = pd.DataFrame({"CODE": ["000001"], "DIR": [Path(self.file_dir).name]})
+
+
+class TestRefreshBackground(unittest.TestCase):
+
+    def setUp(self):
+        self.dirs = [Path(tempfile.mkdtemp()) for _ in range(2)]
+        for file_dir in self.dirs:
+            self.addCleanup(shutil.rmtree, file_dir, ignore_errors=True)
+        RefreshDF.release.clear()
+        self.addCleanup(RefreshDF.release.set)
+
+    def test_per_dir(self):
+        refreshed = []
+        loaders = [RefreshDF(file_dir=d, on_refresh=lambda loader: refreshed.append(loader.file_dir))
+                   for d in self.dirs]
+        events = [loader.refresh_background() for loader in loaders]
+        # 同一个数据目录共用一个后台更新
+        self.assertIs(RefreshDF(file_dir=self.dirs[0]).refresh_background(), events[0])
+        # 不同数据目录中的同一个类分别更新
+        self.assertIsNot(events[0], events[1])
+        RefreshDF.release.set()
+        for event in events:
+            self.assertTrue(event.wait(10))
+        self.assertEqual(sorted(refreshed), sorted(self.dirs))
+        for d in self.dirs:
+            df = RefreshDF(file_dir=d).df
+            self.assertEqual(df.DIR.tolist(), [d.name])
+
+
+if __name__ == "__main__":
+    unittest.main()
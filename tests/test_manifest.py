@@ -0,0 +1,57 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+from utils.dfloader import DFLoader
+from utils.manifest import Manifest
+
+
+class ManifestDF(DFLoader):
+
+    """ 测试用的数据源: 有需要转换类型的列, 也有不需要转换的列 """
+
+    remote = False
+    dtypes = {"CODE": "code", "TYPE": "category", "VALUE": "float32"}
+
+    def get(self):
+        self.df = pd.DataFrame({
+            "CODE": ["000001", "000002", "000003"],
+            "NAME": ["甲", "乙", "丙"],
+            "TYPE": ["A", "B", "A"],
+            "VALUE": [1.5, None, 2.5],
+            "COUNT": [1, 2, 3],
+        })
+
+
+class TestSchemaHash(unittest.TestCase):
+
+    def setUp(self):
+        self.file_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.file_dir, ignore_errors=True)
+
+    def _check(self, storage):
+        loader = ManifestDF(file_dir=self.file_dir, storage=storage)
+        loader.update()
+        saved = loader.get_cache_entry()
+        # 保存时记录的列结构就是加载后的列结构
+        self.assertEqual(saved["schema_hash"], Manifest.schema_hash(loader.df))
+        # 删除清单后重建 (新的实例, 重新读取所有文件), 记录相同
+        (self.file_dir / Manifest.filename).unlink()
+        manifest = Manifest(self.file_dir)
+        manifest.rebuild()
+        rebuilt = manifest.get(saved["path"])
+        for key in ["rows", "schema_hash", "content_hash"]:
+            self.assertEqual(rebuilt[key], saved[key], f"storage = {storage}, key = {key}")
+
+    def test_csv(self):
+        self._check("csv")
+
+    def test_feather(self):
+        self._check("feather")
+
+
+if __name__ == "__main__":
+    unittest.main()
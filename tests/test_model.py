@@ -0,0 +1,176 @@
+import contextlib
+import io
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from model.model import SimpleFundModel
+
+
+def adjust(fractions):
+    """原来的 SimpleFundModel._adjust (一维)"""
+    fractions = np.array(fractions)
+    target_sum = round(fractions.sum())
+    integers = np.floor(fractions).astype(int)
+    remaining = target_sum - integers.sum()
+    decimal_parts = fractions - integers
+    indices = np.argsort(decimal_parts)[::-1]
+    integers[indices[:int(remaining)]] += 1
+    return integers
+
+
+def fund_by_type(pool, fund_type, budget, unit):
+    """原来的 SimpleFundModel.get_fund_by_type (pd.cut 分区间, 每个区间 sort_values 后取前几个)"""
+    df = pool[pool.TYPE == fund_type]
+    df = df.sort_values(by="RATE", ascending=False)
+    num = int(budget / unit)
+    if num >= len(df):
+        k = num // len(df)
+        s = int(num % len(df))
+        fund = df[["CODE"]].reset_index()
+        fund["BUDGET"] = k * unit
+        if s > 0:
+            fund.loc[0:s-1, "BUDGET"] = (k+1) * unit
+    else:
+        df["RATE_BIN"] = pd.cut(df.RATE, bins=num, include_lowest=True)
+        df_bin = df.groupby("RATE_BIN", observed=True).size().reset_index(name="COUNT")
+        df_bin["PROPORTION"] = df_bin.COUNT / df_bin.COUNT.sum()
+        weight = (df_bin.PROPORTION * num).tolist()
+        df_bin["NUM"] = adjust(weight)
+        fund_dfs = []
+        for _, r in df_bin.iterrows():
+            df_bin_fund = df[df.RATE_BIN == r.RATE_BIN].sort_values(by="RATE", ascending=False)
+            fund_dfs.append(df_bin_fund.iloc[:int(r.NUM)])
+        fund = pd.concat(fund_dfs).reset_index(drop=True)
+        fund["BUDGET"] = unit
+    return fund[["CODE", "BUDGET"]].reset_index(drop=True)
+
+
+def make_pool(n, seed, ties=False, nan=0.0):
+    """测试用的基金池: ties 为 True 时收益率取整 (有大量相同的收益率), nan 为空收益率的比例"""
+    rng = np.random.default_rng(seed)
+    rate = rng.normal(5, 10, n)
+    rate = rate.round(0) if ties else rate.round(4)
+    rate[rng.random(n) < nan] = np.nan
+    return pd.DataFrame({
+        "CODE": [f"{i:06d}" for i in range(n)],
+        "TYPE": pd.Categorical(rng.choice(["A", "B", "C"], n)),
+        "RATE": rate,
+    })
+
+
+def make_model(pool, unit):
+    """不加载数据的模型"""
+    model = SimpleFundModel.__new__(SimpleFundModel)
+    model.budget = None
+    model.unit = unit
+    model.pool = pool
+    model.fund = None
+    model._selections = {}
+    return model
+
+
+class TestFundByType(unittest.TestCase):
+
+    def _check(self, pool, unit=5):
+        model = make_model(pool, unit)
+        for fund_type in ["A", "B", "C"]:
+            size = (pool.TYPE == fund_type).sum()
+            if size == 0:
+                continue
+            # 份数小于和不小于基金数量
+            for num in sorted({1, 2, 3, size // 3, size // 2, size - 1, size, size + 1, 2 * size + 3}):
+                if num <= 0:
+                    continue
+                expected = fund_by_type(pool, fund_type, num * unit, unit)
+                actual = model.get_fund_by_type(fund_type, num * unit)
+                pd.testing.assert_frame_equal(actual, expected, check_dtype=False,
+                                              obj=f"type = {fund_type}, num = {num}")
+                # 第二次从缓存中获取
+                pd.testing.assert_frame_equal(model.get_fund_by_type(fund_type, num * unit), actual)
+
+    def test_distinct_rates(self):
+        for seed in range(3):
+            self._check(make_pool(120, seed))
+
+    def test_tied_rates(self):
+        for seed in range(5):
+            self._check(make_pool(200, seed, ties=True))
+
+    def test_nan_rates(self):
+        for seed in range(3):
+            self._check(make_pool(150, seed, ties=True, nan=0.2))
+
+    def test_small_pool(self):
+        for n in [3, 7, 20]:
+            self._check(make_pool(n, n, ties=True), unit=1)
+
+    def test_empty_type(self):
+        # 基金池中没有这个类型的基金
+        model = make_model(make_pool(50, 0), 5)
+        for num in [1, 10, 100]:
+            position, count = model._select("D", num)
+            self.assertEqual((len(position), len(count)), (0, 0))
+            fund = model.get_fund_by_type("D", num * 5)
+            self.assertEqual(fund.columns.tolist(), ["CODE", "BUDGET"])
+            self.assertEqual(len(fund), 0)
+
+
+class TestRunMany(unittest.TestCase):
+
+    def setUp(self):
+        # 测试用的基金池、类型权重和基金信息, 代替 FundParamDF, FundTypeParamDF 和 FundStarDF
+        rng = np.random.default_rng(0)
+        pool = make_pool(90, 0, ties=True, nan=0.1)
+        pool["COMMISSION"] = rng.random(len(pool)).round(2)
+        self.pool = pool
+        type_param = pd.DataFrame({"TYPE": ["A", "B", "C"], "WEIGHT": [0.5, 0.3, 0.2]})
+        # 部分基金没有基金信息
+        info = pd.DataFrame({"CODE": pool.CODE[rng.random(len(pool)) < 0.9]})
+        info["NAME"] = "基金" + info.CODE
+        info["MANAGER"] = "经理" + info.CODE.str[-2:]
+        info["COMPANY"] = "公司" + info.CODE.str[-1]
+        info["COUNT_5S"] = rng.integers(0, 10, len(info))
+
+        def loader(df):
+            return lambda *args, **kwargs: SimpleNamespace(df=df.copy())
+        for name, df in [("FundParamDF", pool), ("FundTypeParamDF", type_param), ("FundStarDF", info)]:
+            patcher = mock.patch(f"model.model.{name}", side_effect=loader(df))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _run(budget, unit):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return SimpleFundModel(budget=budget, unit=unit).run()
+
+    def _check(self, budgets, units):
+        fund = SimpleFundModel.run_many(budgets, units)
+        budgets, units = np.broadcast_arrays(np.atleast_1d(budgets), np.atleast_1d(units))
+        for i, (budget, unit) in enumerate(zip(budgets, units)):
+            actual = fund[fund.REQUEST == i].drop(columns=["REQUEST"]).reset_index(drop=True)
+            expected = self._run(budget, unit)
+            pd.testing.assert_frame_equal(actual, expected, check_dtype=False,
+                                          obj=f"budget = {budget}, unit = {unit}")
+
+    def test_lists(self):
+        self._check([50, 100, 5, 35, 400], [5, 5, 1, 5, 10])
+
+    def test_scalar_unit(self):
+        self._check([50, 100, 250], 5)
+
+    def test_scalars(self):
+        self._check(50, 5)
+
+    def test_missing_type(self):
+        # 基金池中没有类型 C 的基金 (例如 benchmark.candidates 只选出部分类型)
+        pool = self.pool[self.pool.TYPE != "C"]
+        with mock.patch("model.model.FundParamDF", side_effect=lambda *args, **kwargs: SimpleNamespace(df=pool)):
+            self._check([50, 100, 5], 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,206 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from fundmgr.df import FundManagerDF
+from fundrate.df import OpenFundRateDF
+from fundstar.df import FundStarDF
+from pool.df import CompanyFundValueDF, FundFactDF, FundPurchaseDF
+from pool.pipline import PoolPipline
+from pool.sweep import grid, sweep
+
+
+def top_codes(rate, head):
+    """原来的算法: 按收益率从高到低排序, 取前 int(head / 100 * 数量) 个基金"""
+    df = rate.dropna(subset=["RATE"]).sort_values(by="RATE", ascending=False)
+    k = int((head / 100) * len(df))
+    return set(df[:k].CODE)
+
+
+class TestFilterRate(unittest.TestCase):
+
+    def _check(self, n, heads, seed=0, exact=False):
+        """exact 为 True 时, 基金代码不重复并且都有收益率 (有收益率的基金数量 = n)"""
+        rng = np.random.default_rng(seed)
+        rates = rng.normal(5, 20, n).round(2)
+        if exact:
+            codes = [f"{i:06d}" for i in range(n)]
+        else:
+            # 有重复的基金代码和空的收益率
+            codes = [f"{i:06d}" for i in rng.integers(0, n, n)]
+            rates[rng.random(n) < 0.1] = np.nan
+        rate = pd.DataFrame({"CODE": codes, "RATE": rates})
+
+        rank, count = FundFactDF._rank(rate, "RATE")
+        fact = pd.DataFrame({"CODE": pd.unique(rate.CODE)})
+        # 和 FundFactDF.dtypes 相同的类型
+        fact["RANK"] = fact.CODE.map(rank).astype("Int32")
+        fact["N"] = pd.Series(count, index=fact.index, dtype="int32")
+        for head in heads:
+            mask = PoolPipline._top(fact.RANK, fact.N, head)
+            self.assertEqual(set(fact.CODE[mask]), top_codes(rate, head), f"n = {n}, head = {head}")
+
+    def test_non_default_heads(self):
+        # float32 计算 k 时会出错的例子: (head, 数量)
+        for head, n in [(70, 90), (29, 100), (13, 900), (58, 50)]:
+            self._check(n, [head], exact=True)
+
+    def test_all_heads(self):
+        for n in [1, 7, 50, 90, 100, 333, 900, 2500]:
+            self._check(n, range(0, 101), seed=n)
+
+
+def save_sources(file_dir, n=1000, seed=0):
+    """在数据目录 file_dir 中保存测试用的数据源 (事实表和基金公司表由它们计算得到, 不需要网络)"""
+    rng = np.random.default_rng(seed)
+    codes = [f"{i:06d}" for i in range(n)]
+    companies = [f"公司{i}" for i in range(30)]
+    managers = [f"经理{i}" for i in range(40)]
+
+    def rate(scale):
+        r = rng.normal(5, scale, n).round(2)
+        r[rng.random(n) < 0.1] = np.nan
+        return r
+
+    sources = {
+        FundPurchaseDF: pd.DataFrame({
+            "NO": np.arange(1, n + 1),
+            "CODE": codes,
+            "NAME": [f"基金{c}" for c in codes],
+            "TYPE": rng.choice(["股票型", "混合型", "债券型"], n),
+            "NAV_10K": rng.random(n).round(4),
+            "NAV_10K_DATE": "2024-01-01",
+            "STATUS_BUY": rng.choice(["开放申购", "暂停申购"], n, p=[0.8, 0.2]),
+            "STATUS_SELL": rng.choice(["开放赎回", "暂停赎回"], n, p=[0.9, 0.1]),
+            "OPEN_DATE_SELL": "",
+            "BUY_MIN": rng.choice([10, 1000, 100_000], n, p=[0.5, 0.4, 0.1]),
+            "BUY_MAX_D": rng.choice([1e4, 1e6, 1e11], n, p=[0.1, 0.4, 0.5]),
+            "COMMISSION": rng.choice([0.0, 0.1, 0.15, 1.5], n, p=[0.3, 0.3, 0.2, 0.2]),
+        }),
+        OpenFundRateDF: pd.DataFrame({
+            **{col: np.nan for col in OpenFundRateDF.header},
+            "NO": np.arange(1, n + 1),
+            "CODE": codes,
+            "NAME": [f"基金{c}" for c in codes],
+            "DATE": "2024-01-01",
+            "RATE_1Y": rate(10),
+            "RATE_2Y": rate(20),
+            "RATE_3Y": rate(30),
+        })[OpenFundRateDF.header],
+        FundStarDF: pd.DataFrame({
+            "CODE": codes,
+            "NAME": [f"星{c}" for c in codes],
+            "MANAGER": [",".join(rng.choice(managers, rng.integers(1, 3), replace=False)) for _ in codes],
+            "COMPANY": rng.choice(companies, n),
+            "COUNT_5S": rng.integers(0, 5, n),
+            "STAR_SHZQ": rng.integers(1, 6, n),
+            "STAR_ZSZQ": rng.integers(1, 6, n),
+            "STAR_JAJX": rng.integers(1, 6, n),
+            "COMMITION": "0.15%",
+            "TYPE": "混合型",
+        }),
+        CompanyFundValueDF: pd.DataFrame({
+            "NO": np.arange(1, len(companies) + 1),
+            "COMPANY": [f"{c}基金管理有限公司" for c in companies],
+            "BUILT_DATE": rng.choice(["2000-01-01", "2010-06-30", "2022-01-01"], len(companies), p=[0.4, 0.4, 0.2]),
+            "FUND_VALUE": rng.random(len(companies)).round(2) * 1000,
+            "FUND_COUNT": rng.integers(1, 100, len(companies)),
+            "MANAGER_COUNT": rng.integers(1, 20, len(companies)),
+            "UPDATE_DATE": "01-01",
+            "COMP": companies,
+        }),
+        FundManagerDF: pd.DataFrame({
+            "NO": np.arange(1, len(managers) + 1),
+            "NAME": managers,
+            "COMPANY": rng.choice(companies, len(managers)),
+            "FUND": "",
+            "EXP": rng.integers(365, 365 * 25, len(managers)),
+            "FUND_VAL": rng.random(len(managers)).round(2),
+            "RATE_MAX": rng.normal(50, 30, len(managers)).round(2),
+        }),
+    }
+    for cls, df in sources.items():
+        loader = cls(file_dir=file_dir)
+        loader.df = df
+        loader.save()
+
+
+class TestPiplineModes(unittest.TestCase):
+
+    """ 同一个数据目录上, 执行顺序 (reorder)、并发方式 (concurrent) 和缓存 (memo) 不影响筛选的结果 """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.file_dir = Path(tempfile.mkdtemp())
+        save_sources(cls.file_dir)
+        # 参考结果: 按 stages 的顺序依次执行, 不使用缓存
+        cls.expected = cls._process(reorder=False, memo=False)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.file_dir, ignore_errors=True)
+
+    @classmethod
+    def _process(cls, **kwargs):
+        return PoolPipline(file_dir=cls.file_dir, **kwargs).process()
+
+    def _check(self, pipline, msg):
+        pd.testing.assert_frame_equal(pipline.df, self.expected.df, obj=msg)
+
+    def test_expected(self):
+        # 每个过滤步骤都过滤掉了一部分基金, 并且结果不为空
+        stats = self._process(reorder=False, memo=False, explain=True).report()
+        self.assertTrue(len(self.expected.df) > 0)
+        self.assertTrue((stats.SELECTIVITY.iloc[1:-1] < 1).all(), stats)
+
+    def test_modes(self):
+        for reorder in [True, False]:
+            for concurrent in [None, "thread", "process"]:
+                msg = f"reorder = {reorder}, concurrent = {concurrent}"
+                self._check(self._process(reorder=reorder, concurrent=concurrent, memo=False), msg)
+
+    def test_memo(self):
+        for reorder in [True, False]:
+            for concurrent in [None, "thread", "process"]:
+                memo_dir = Path(tempfile.mkdtemp(dir=self.file_dir))
+                for memo in ["miss", "hit"]:
+                    msg = f"reorder = {reorder}, concurrent = {concurrent}, memo = {memo}"
+                    pipline = self._process(reorder=reorder, concurrent=concurrent,
+                                            memo_dir=memo_dir, explain=True)
+                    self._check(pipline, msg)
+                    report = pipline.report()
+                    stages = report[report.STAGE.isin(PoolPipline.stage_hints)]
+                    self.assertTrue((stages.MEMO == memo).all(), msg)
+
+
+
+class TestSweep(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.file_dir = Path(tempfile.mkdtemp())
+        save_sources(cls.file_dir)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.file_dir, ignore_errors=True)
+
+    def test_size(self):
+        # 每个参数组合的基金数量与 PoolPipline 的结果相同
+        configs = grid({"head1": [10, 20], "value_head": [30, 60], "exp_lb": [3, 5]})
+        result = sweep(configs, max_workers=1, file_dir=self.file_dir, memo=True)
+        for config, size in zip(configs, result.SIZE):
+            df = PoolPipline(file_dir=self.file_dir, memo=False, **config).process().df
+            self.assertEqual(size, len(df), config)
+
+    def test_unknown_parameters(self):
+        with self.assertRaisesRegex(AssertionError, "head_1"):
+            sweep([{"head1": 10}, {"head_1": 10}], max_workers=1, file_dir=self.file_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
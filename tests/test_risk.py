@@ -0,0 +1,47 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from model.risk import RiskSimulator
+
+
+class TestSimulate(unittest.TestCase):
+
+    def setUp(self):
+        # 测试用的收益率, 代替 FundFactDF
+        rng = np.random.default_rng(0)
+        n = 30
+        fact = pd.DataFrame({
+            "CODE": [f"{i:06d}" for i in range(n)],
+            "TYPE": rng.choice(["A", "B", "C"], n),
+            "RATE_1Y": rng.normal(5, 10, n),
+            "RATE_2Y": rng.normal(10, 20, n),
+            "RATE_3Y": rng.normal(15, 30, n),
+        })
+        fact.loc[rng.random(n) < 0.2, "RATE_3Y"] = np.nan
+        patcher = mock.patch("model.risk.FundFactDF", side_effect=lambda *args, **kwargs: SimpleNamespace(df=fact))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # 三个组合
+        request = rng.integers(0, 3, 60)
+        self.fund = pd.DataFrame({
+            "REQUEST": np.sort(request),
+            "CODE": rng.choice(fact.CODE, 60),
+            "BUDGET": rng.integers(1, 10, 60) * 5,
+        })
+
+    def test_process_count(self):
+        # 结果与进程数无关 (完全相同, 不只是近似)
+        for method in ["normal", "bootstrap"]:
+            reports = [RiskSimulator(method=method, n_paths=50000, chunk_size=4000, seed=1,
+                                     max_workers=workers).simulate(self.fund)
+                       for workers in [None, 2, 3]]
+            for report in reports[1:]:
+                pd.testing.assert_frame_equal(report, reports[0], check_exact=True, obj=method)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,177 @@
+import asyncio
+import threading
+import unittest
+
+from utils.scheduler import FetchScheduler
+
+
+class FakeClock:
+
+    """ 假的时钟: sleep 不等待, 只把时间往前拨, 并记录每次等待的时间 """
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    async def async_sleep(self, seconds):
+        # 需要让出事件循环, 其它协程才能继续执行
+        self.sleep(seconds)
+        await asyncio.sleep(0)
+
+
+def make_scheduler(clock, **kwargs):
+    return FetchScheduler(clock=clock, sleep=clock.sleep, async_sleep=clock.async_sleep, **kwargs)
+
+
+class TestRateLimit(unittest.TestCase):
+
+    def test_burst(self):
+        # 令牌桶容量为 3: 前 3 个请求不等待, 之后每秒 2 个
+        clock = FakeClock()
+        scheduler = make_scheduler(clock, rate=2.0, burst=3)
+        for _ in range(6):
+            scheduler.run(lambda: None)
+        self.assertEqual(clock.sleeps, [0, 0, 0, 0.5, 0.5, 0.5])
+        self.assertEqual(clock.now, 1.5)
+
+    def test_refill(self):
+        clock = FakeClock()
+        scheduler = make_scheduler(clock, rate=1.0, burst=2)
+        for _ in range(2):
+            scheduler.run(lambda: None)
+        # 空闲 0.5 秒, 补充半个令牌
+        clock.now += 0.5
+        scheduler.run(lambda: None)
+        self.assertEqual(clock.sleeps[-1], 0.5)
+        # 空闲很久, 令牌数不超过桶的容量
+        clock.now += 100
+        clock.sleeps = []
+        for _ in range(3):
+            scheduler.run(lambda: None)
+        self.assertEqual(clock.sleeps, [0, 0, 1.0])
+
+    def test_queue(self):
+        # 令牌不足时, 后面的请求依次排队 (不需要实际等待, 也会按预定的时间计算)
+        clock = FakeClock()
+        scheduler = make_scheduler(clock, rate=1.0, burst=1)
+        self.assertEqual([scheduler._reserve() for _ in range(4)], [0, 1.0, 2.0, 3.0])
+
+
+class TestConcurrency(unittest.TestCase):
+
+    def test_max_workers(self):
+        clock = FakeClock()
+        scheduler = make_scheduler(clock, rate=1000.0, burst=100, max_workers=2)
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+        entered = threading.Semaphore(0)
+        release = threading.Event()
+
+        def fn():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            entered.release()
+            release.wait(5)
+            with lock:
+                running[0] -= 1
+
+        threads = [threading.Thread(target=scheduler.run, args=(fn,)) for _ in range(5)]
+        for t in threads:
+            t.start()
+        # 两个请求开始后, 其它请求等待并发名额
+        for _ in range(2):
+            self.assertTrue(entered.acquire(timeout=5))
+        self.assertFalse(entered.acquire(timeout=0.2))
+        self.assertEqual(scheduler._running, 2)
+        release.set()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(peak[0], 2)
+        self.assertEqual(scheduler._running, 0)
+
+    def test_async_max_workers(self):
+        clock = FakeClock()
+        scheduler = make_scheduler(clock, rate=1000.0, burst=100, max_workers=2)
+        running = [0]
+        peak = [0]
+
+        async def fn():
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await asyncio.sleep(0.01)
+            running[0] -= 1
+
+        async def main():
+            await asyncio.gather(*[scheduler.arun(fn) for _ in range(5)])
+
+        asyncio.run(main())
+        self.assertEqual(peak[0], 2)
+        self.assertEqual(scheduler._running, 0)
+
+
+class TestRetry(unittest.TestCase):
+
+    def _scheduler(self, clock):
+        # 重试等待时间固定为 100 毫秒, 每次翻倍
+        return make_scheduler(clock, rate=1000.0, burst=100, retries=3, wait_time=lambda: 100)
+
+    def test_retry_then_succeed(self):
+        clock = FakeClock()
+        calls = []
+
+        def fn():
+            calls.append(clock.now)
+            if len(calls) < 3:
+                raise ConnectionError("offline")
+            return "data"
+
+        self.assertEqual(self._scheduler(clock).run(fn), "data")
+        self.assertEqual(len(calls), 3)
+        self.assertEqual([s for s in clock.sleeps if s > 0], [0.1, 0.2])
+
+    def test_retries_exhausted(self):
+        clock = FakeClock()
+        calls = []
+
+        def fn():
+            calls.append(len(calls))
+            raise ConnectionError(f"offline {len(calls)}")
+
+        scheduler = self._scheduler(clock)
+        with self.assertRaisesRegex(ConnectionError, "offline 4"):
+            scheduler.run(fn)
+        # 第一次请求加上 retries 次重试
+        self.assertEqual(len(calls), 4)
+        self.assertEqual([s for s in clock.sleeps if s > 0], [0.1, 0.2, 0.4])
+        self.assertEqual(scheduler._running, 0)
+
+    def test_backoff_bound(self):
+        clock = FakeClock()
+        scheduler = make_scheduler(clock, wait_time=lambda: 3000)
+        self.assertEqual([scheduler._backoff(i) for i in range(1, 5)], [3.0, 6.0, 10.0, 10.0])
+
+    def test_async_retries_exhausted(self):
+        clock = FakeClock()
+        calls = []
+
+        async def fn():
+            calls.append(len(calls))
+            raise ConnectionError("offline")
+
+        with self.assertRaises(ConnectionError):
+            asyncio.run(self._scheduler(clock).arun(fn))
+        self.assertEqual(len(calls), 4)
+        self.assertEqual([s for s in clock.sleeps if s > 0], [0.1, 0.2, 0.4])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+from utils.dfloader import DFLoader
+from utils.storage import get_dir_storage, migrate
+
+
+class MigrateDF(DFLoader):
+
+    """ 测试用的数据源 """
+
+    remote = False
+    dtypes = {"CODE": "code", "TYPE": "category", "VALUE": "float32"}
+
+    def get(self):
+        self.df = pd.DataFrame({"CODE": ["000001", "000002"], "TYPE": ["A", "B"], "VALUE": [1.5, 2.5]})
+
+
+class TestMigrate(unittest.TestCase):
+
+    def setUp(self):
+        self.file_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.file_dir, ignore_errors=True)
+
+    def test_migrate(self):
+        MigrateDF(file_dir=self.file_dir).update()
+        date = time.strftime("%Y%m%d", time.localtime())
+        self.assertTrue((self.file_dir / f"MigrateDF_{date}.csv").exists())
+        self.assertEqual(get_dir_storage(self.file_dir), "csv")
+
+        migrated = migrate(self.file_dir, storage="feather", loaders=[MigrateDF])
+        self.assertEqual([path.name for path in migrated], [f"MigrateDF_{date}.feather"])
+        self.assertEqual(get_dir_storage(self.file_dir), "feather")
+        # 迁移后的文件保存了列类型
+        df = pd.read_feather(migrated[0])
+        self.assertEqual(df.CODE.tolist(), ["000001", "000002"])
+        self.assertIsInstance(df.TYPE.dtype, pd.CategoricalDtype)
+        self.assertEqual(df.VALUE.dtype, "float32")
+
+        # 同一天有两种格式的文件时, 读取迁移后的格式
+        loader = MigrateDF(file_dir=self.file_dir)
+        self.assertEqual(loader._get_filename(), f"MigrateDF_{date}.feather")
+        pd.testing.assert_frame_equal(loader.df, df)
+        # 之后保存的也是迁移后的格式
+        loader.update()
+        self.assertEqual(loader.get_cache_entry()["path"], f"MigrateDF_{date}.feather")
+
+    def test_remove(self):
+        MigrateDF(file_dir=self.file_dir).update()
+        migrate(self.file_dir, storage="parquet", remove=True, loaders=[MigrateDF])
+        self.assertEqual(list(self.file_dir.glob("*.csv")), [])
+        loader = MigrateDF(file_dir=self.file_dir)
+        self.assertEqual(loader._list_filenames(), [f"MigrateDF_{time.strftime('%Y%m%d', time.localtime())}.parquet"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import shutil
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+from utils.dfloader import DFLoader
+from utils.scheduler import FetchScheduler
+from utils.warmer import warm
+
+
+class StubDF(DFLoader):
+
+    """ 测试用的数据源: 数据保存在 file_dir 中, get 的行为由 action 决定 """
+
+    file_dir = None  # 测试时设置
+    action = None  # get 时调用 action(loader), 返回数据
+
+    def __init__(self, **kwargs):
+        super().__init__(file_dir=self.file_dir, **kwargs)
+
+    def get(self):
+        self.df = self.action()
+
+
+def stub(name, action):
+    """名称为 name 的 StubDF 子类"""
+    return type(name, (StubDF,), {"action": staticmethod(action)})
+
+
+def data():
+    return pd.DataFrame({"CODE": ["000001", "000002"], "VALUE": [1.0, 2.0]})
+
+
+class TestWarm(unittest.TestCase):
+
+    def setUp(self):
+        StubDF.file_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, StubDF.file_dir, ignore_errors=True)
+        # 不等待: 令牌不足、重试时都直接执行
+        self.scheduler = FetchScheduler(sleep=lambda seconds: None, retries=1, max_workers=4)
+
+    def _warm(self, loaders, **kwargs):
+        return warm(loaders, scheduler=self.scheduler, **kwargs)
+
+    def test_ok(self):
+        OkDF = stub("OkDF", data)
+        summary = self._warm([OkDF])
+        self.assertEqual(summary["OkDF"]["status"], "ok")
+        pd.testing.assert_frame_equal(OkDF().df, data())
+
+    def test_skip(self):
+        calls = []
+        SkipDF = stub("SkipDF", lambda: calls.append(1) or data())
+        loader = SkipDF()
+        loader.df = data()
+        loader.save()
+        summary = self._warm([SkipDF])
+        self.assertEqual(summary["SkipDF"]["status"], "skip")
+        self.assertEqual(calls, [])
+        # force 为 True 时不管是否过期都更新
+        self.assertEqual(self._warm([SkipDF], force=True)["SkipDF"]["status"], "ok")
+        self.assertEqual(calls, [1])
+
+    def test_fail(self):
+        def fail():
+            raise ConnectionError("offline")
+        FailDF = stub("FailDF", fail)
+        EmptyDF = stub("EmptyDF", pd.DataFrame)
+        summary = self._warm([FailDF, EmptyDF])
+        self.assertEqual(summary["FailDF"]["status"], "fail")
+        self.assertIn("ConnectionError", summary["FailDF"]["error"])
+        self.assertEqual(summary["EmptyDF"]["status"], "fail")
+        self.assertIsNone(FailDF(lazy=True).get_cache_entry())
+
+    def test_timeout(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        SlowDF = stub("SlowDF", lambda: release.wait(10) and data())
+        OkDF = stub("OkDF", data)
+        # 只有一个线程: 超时后由新的线程接着更新剩下的数据源
+        summary = self._warm([SlowDF, OkDF], max_workers=1, timeout=0.2)
+        self.assertEqual(summary["SlowDF"]["status"], "timeout")
+        self.assertEqual(summary["OkDF"]["status"], "ok")
+
+    def test_max_workers(self):
+        # 所有数据源同时获取数据时才能通过, 并发数小于 max_workers 时超时失败
+        barrier = threading.Barrier(4, timeout=5)
+        loaders = [stub(f"Stub{i}DF", lambda: barrier.wait() >= 0 and data()) for i in range(4)]
+        summary = warm(loaders, max_workers=4)
+        self.assertEqual({r["status"] for r in summary.values()}, {"ok"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,9 @@
 from .logger import logger
+from .metrics import metrics
+from .registry import registry
+from .scheduler import scheduler
 from .dfloader import DFLoader
 from .dfplot import DFPlot
+from .stats import Stats
 from .dfsummary import DFSummary
 from .waiter import WT
\ No newline at end of file
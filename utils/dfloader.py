@@ -1,115 +1,419 @@
+import copy
+import threading
 import time
 from pathlib import Path
 
-import pandas as pd
-
+from .history import HistoryStore
+from .lock import FileLock
 from .logger import logger
+from .manifest import get_manifest
+from .metrics import metrics
+from .registry import registry
+from .scheduler import scheduler
+from .schema import apply_schema
+from .storage import atomic_write, get_dir_storage, get_storage, get_storage_by_path
 
 
 class DFLoader:
 
+    storage = None  # 缓存格式: csv, feather, parquet (参考 utils.storage); None 表示使用数据目录的格式
+    use_registry = True  # 是否使用进程内共享的数据缓存 (参考 utils.registry)
+    remote = True  # 数据是否来自远程数据源 (例如 akshare)
+    key = "CODE"  # 主键, 用于增量保存历史数据 (参考 utils.history)
+    history_keep = 365  # 历史数据保留天数
+    dtypes = None  # 列类型, 加载和保存时转换 (参考 utils.schema)
+    stale_ok = False  # 数据过期时, 先返回旧数据, 在后台线程中更新 (stale-while-revalidate)
+    max_stale = 30  # stale_ok 时, 过期超过多少天后必须等待更新 (单位: 天), None 表示不限制
+    read_retry = 3  # 数据文件被其它进程删除时, 重新查找并读取的次数
+    depends = None  # 上游数据源 (DFLoader 子类列表)。上游的最新快照变化或者上游过期时, 认为数据过期
+
     def __init__(self, **kwargs):
-        self.df = None
+        self._df = None
+        self._loading = False
         self.header = None
         self.expire = 30  # 过期天数
         self.file_dir = Path("./data")
+        self.lazy = True  # 为 True 时, 第一次访问 df 时才加载数据; 为 False 时, 初始化时加载
+        self.columns = None  # 只加载这些列, None 表示所有列
+        self.on_refresh = None  # 后台更新完成后的回调函数 on_refresh(loader)
+        self.refreshed = None  # 后台更新完成的事件 (threading.Event), 没有后台更新时为 None
+        self.scheduler = None  # 远程请求的调度器 (参考 utils.scheduler), None 表示进程内共享的 scheduler
         for k, v in kwargs.items():
             setattr(self, k, v)
-        self.load()
+        if not self.lazy:
+            self.load()
+
+    @property
+    def df(self):
+        """数据。第一次访问时加载 (参考 load)。"""
+        if self._df is None and not self._loading:
+            self.load()
+        return self._df
+
+    @df.setter
+    def df(self, df):
+        self._df = df
+
+    def _list_filenames(self):
+        """列出当前类的所有数据文件名称，最新的在前面。
+        同一天有多种格式的文件时，优先使用当前的存储格式 (参考 _storage)。
+        """
+        suffix = self._storage().suffix
+        # 从数据目录的清单中查找, 不需要遍历数据目录
+        filenames = get_manifest(self.file_dir).filenames(self.__class__.__name__)
+        # 按照文件名中的日期排序，最新的在前面
+        filenames.sort(key=lambda x: (self._get_date(x), x.endswith(f".{suffix}")), reverse=True)
+        return filenames
+
+    def _storage(self):
+        """保存数据使用的存储格式: self.storage, 没有指定时使用数据目录的格式 (迁移后为迁移的目标格式)"""
+        return get_storage(self.storage or get_dir_storage(self.file_dir))
+
+    @staticmethod
+    def _get_date(filename):
+        """从文件名中获取日期, 例如 FundStarDF_20240101.csv -> 20240101"""
+        return filename.split("_")[-1].split(".")[0]
 
     def _get_filename(self):
         """获取数据文件的文件名称。
         如果文件不存在则返回 None；如果有多个文件，返回最新的文件名。
         """
-        prefix = f"{self.__class__.__name__}"
-        filenames = []
-        for filename in Path.iterdir(self.file_dir):
-            if filename.name.startswith(prefix):
-                filenames.append(filename.name)
+        filenames = self._list_filenames()
         if len(filenames) == 0:
             return None
-        # 按照文件名中的日期排序，最新的在前面
-        filenames.sort(key=lambda x: x.split('_')[-1].split('.')[0], reverse=True)
         # 返回最新的元素
         return filenames[0]
 
+    def _get_age(self, filename):
+        """数据文件的天数"""
+        date = time.strptime(self._get_date(filename), "%Y%m%d")
+        date = time.mktime(date)
+        now = time.time()
+        return (now - date) / (24 * 60 * 60)
+
     def _is_expired(self, filename):
         """判断数据是否过期。
         注意：如果文件不存在，也认为数据过期。
         """
         if filename is None:
             return True
-        date = filename.split("_")[-1].split(".")[0]
-        date = time.strptime(date, "%Y%m%d")
-        date = time.mktime(date)
-        now = time.time()
-        return (now - date) > self.expire * 24 * 60 * 60
+        if self._get_age(filename) > self.expire:
+            return True
+        if self.depends:
+            entry = get_manifest(self.file_dir).get(filename)
+            if entry is None or entry.get("inputs") != self._inputs():
+                return True
+            # 上游过期时, 加载上游会先更新上游, 所以当前数据也需要重新计算
+            return any(self._upstream_expired(cls) for cls in self.depends)
+        return False
+
+    def _upstream_expired(self, cls):
+        """上游数据源是否过期 (递归检查上游的上游)。
+        注意：上游可以先使用旧数据时 (参考 stale_ok), 不认为过期; 上游更新完成后内容哈希变化, 再重新计算。
+        """
+        loader = cls(lazy=True, file_dir=self.file_dir)
+        filename = loader._get_filename()
+        return loader._is_expired(filename) and not loader._is_stale_ok(filename)
+
+    def _inputs(self):
+        """上游数据源的最新快照: 类名 -> 内容哈希 (没有快照时为 None)"""
+        inputs = {}
+        for cls in self.depends or []:
+            loader = cls(lazy=True, file_dir=self.file_dir)
+            entry = loader.get_cache_entry()
+            inputs[cls.__name__] = None if entry is None else entry["content_hash"]
+        return inputs
+
+    def _is_stale_ok(self, filename):
+        """过期的数据是否可以先使用 (参考 stale_ok, max_stale)"""
+        if not self.stale_ok or filename is None:
+            return False
+        return self.max_stale is None or self._get_age(filename) <= self.expire + self.max_stale
+
+    def is_expired(self):
+        """判断最新的数据是否过期 (不加载数据)"""
+        return self._is_expired(self._get_filename())
 
     def _remove_expired(self):
         """删除过期的数据文件。
-        注意：至少保留一个文件（无论是否过期）。
+        注意：至少保留最新日期的文件（无论是否过期）。
         """
-        prefix = f"{self.__class__.__name__}"
-        filenames = []
-        for filename in Path.iterdir(self.file_dir):
-            if filename.name.startswith(prefix):
-                filenames.append(filename.name)
-        # 按照文件名中的日期排序，最新的在前面
-        filenames.sort(key=lambda x: x.split('_')[-1].split('.')[0], reverse=True)
+        filenames = self._list_filenames()
         if len(filenames) <= 1:
             return
+        latest = self._get_date(filenames[0])
+        manifest = get_manifest(self.file_dir)
         for filename in filenames[1:]:
-            Path.unlink(self.file_dir / filename)
+            if self._get_date(filename) != latest:
+                with manifest.lock():
+                    try:
+                        Path.unlink(self.file_dir / filename)
+                    except FileNotFoundError:
+                        pass  # 已经被其它进程删除
+                    except OSError as e:
+                        # 例如 Windows 上文件正在被其它进程读取, 下次再删除
+                        logger.warning(f"[Remove]: file = {filename}, error = {e!r}")
+                        continue
+                    manifest.remove(filename)
+        # 历史数据按保留天数压缩
+        self._history().compact()
+
+    def lock(self):
+        """当前类的数据文件锁 (跨进程), 更新数据时持有"""
+        return FileLock(self.file_dir / ".lock" / f"{self.__class__.__name__}.lock")
+
+    def _history(self):
+        return HistoryStore(self.file_dir, self.__class__.__name__, self.key,
+                            storage=self._storage().name, keep=self.history_keep, dtypes=self.dtypes)
+
+    def _registry_name(self):
+        """registry 中的名称: 不同数据目录中的同名数据分开缓存"""
+        return f"{self.__class__.__name__}@{Path(self.file_dir).resolve()}"
+
+    def _read(self, filename):
+        """按文件格式读取数据文件。
+        同一个快照在进程内只读取一次，之后从 registry 中获取。
+        如果指定了 self.columns, 只返回这些列; 列式格式 (feather, parquet) 只读取这些列。
+        """
+        name = self.__class__.__name__
+        date = self._get_date(filename)
+        storage = get_storage_by_path(filename)
+        df = registry.get(self._registry_name(), date) if self.use_registry else None
+        if df is not None:
+            metrics.inc(name, "registry_hit")
+        if df is None and self.columns is not None and storage.columnar:
+            return self._parse(storage, filename, columns=self.columns)
+        if df is None:
+            df = self._parse(storage, filename)
+            if self.use_registry:
+                df = registry.put(self._registry_name(), date, df)
+        if self.columns is not None:
+            df = df[self.columns]
+        return df
+
+    def _parse(self, storage, filename, columns=None):
+        """从文件读取数据并转换列类型, 记录耗时、文件大小和内存占用"""
+        name = self.__class__.__name__
+        path = self.file_dir / filename
+        with metrics.timer(name, "parse_seconds"):
+            df = apply_schema(storage.read(path, columns=columns), self.dtypes)
+        metrics.set(name, "rows", len(df))
+        metrics.set(name, "file_bytes", path.stat().st_size)
+        metrics.set(name, "memory_bytes", int(df.memory_usage(deep=True).sum()))
+        return df
 
-    def load(self):
-        """加载数据"""
+    def load(self, as_of=None):
+        """加载数据
+        :param as_of: 日期 (YYYYMMDD)。如果指定, 从历史数据中加载当天或之前最近的快照
+        """
+        self._loading = True
+        try:
+            self._load(as_of)
+        finally:
+            self._loading = False
+
+    def _load(self, as_of=None):
+        if as_of is not None:
+            df = self._history().load(as_of)
+            self.df = df if self.columns is None else df[self.columns]
+            logger.info(f"[Load]: data = {self.__class__.__name__}, as_of = {as_of}")
+            return
         # 如果数据过期, 则更新并保存数据
         # 注意: 如果数据不存在, 也认为数据过期
         use_cache = True
-        if self._is_expired(self._get_filename()):
-            use_cache = False
-            self.get()
-            self.save()
-            self._remove_expired()
+        filename = self._get_filename()
+        expired = self._is_expired(filename)
+        if expired and self._is_stale_ok(filename):
+            use_cache = "stale"
+            self.refresh_background()
+        elif expired:
+            # 等待锁期间, 数据可能已经被其它进程更新
+            use_cache = not self.refresh(force=False)
+
+        self.df = self._read_latest()
+        name = self.__class__.__name__
+        metrics.inc(name, {True: "cache_hit", False: "cache_miss", "stale": "cache_stale"}[use_cache])
+        metrics.set(name, "snapshot_age_days", round(self._get_age(self._get_filename()), 2))
+        logger.info(f"[Load]: data = {name}, use_cache = {use_cache}")
 
-        self.df = pd.read_csv(self.file_dir / self._get_filename())
-        logger.info(f"[Load]: data = {self.__class__.__name__}, use_cache = {use_cache}")
+    def _read_latest(self):
+        """读取最新的数据文件。
+        读取时文件可能刚好被其它进程删除 (例如删除过期文件), 此时重新查找最新的文件。
+        """
+        for i in range(self.read_retry):
+            try:
+                return self._read(self._get_filename())
+            except FileNotFoundError:
+                if i + 1 == self.read_retry:
+                    raise
+                time.sleep(0.1)
 
     def save(self):
         """保存数据
         """
-        if self.df is None or self.df.empty:
+        with metrics.timer(self.__class__.__name__, "save_seconds"):
+            self._save()
+
+    def _save(self):
+        # 注意: 这里使用 self._df, 访问 self.df 可能会触发加载
+        if self._df is None or self._df.empty:
             logger.info("[Get]: FAIL")
             return
         # 文件名为 class 名称 + 日期
+        storage = self._storage()
         date = time.strftime("%Y%m%d", time.localtime())
-        filename = f"{self.__class__.__name__}_{date}.csv"
+        filename = f"{self.__class__.__name__}_{date}.{storage.suffix}"
         if self.header is None:
-            self.header = self.df.columns
-        self.df.to_csv(self.file_dir / filename,
-                       header=self.header, index=False)
+            self.header = self._df.columns
+        df = self._df.copy()
+        df.columns = self.header
+        df = apply_schema(df, self.dtypes)
+        manifest = get_manifest(self.file_dir)
+        if self.depends:
+            # 记录计算时使用的上游快照, 用于判断是否需要重新计算
+            inputs = self._inputs()
+        # 写入文件和更新清单之间, 其它进程不会读取清单
+        with manifest.lock():
+            # 先写临时文件再重命名, 中途失败不会留下损坏的文件
+            atomic_write(storage, df, self.file_dir / filename)
+            # 清单记录的列结构是加载时的列结构 (读取文件后转换列类型), 与重建清单时相同
+            loaded = self._parse(storage, filename)
+            entry = manifest.make_entry(filename, loaded)
+            if self.depends:
+                entry["inputs"] = inputs
+            manifest.add(entry)
+        self._save_history(date, df)
+        # 内存中的旧数据作废, 换成刚保存的数据, 之后加载时不需要再读取文件
+        registry.invalidate(self._registry_name())
+        if self.use_registry:
+            registry.put(self._registry_name(), date, loaded)
         logger.info("[Get]: SUCCESS")
 
+    def _save_history(self, date, df):
+        """增量保存历史数据。
+        第一次保存时, 把数据目录中已有的旧快照也加入历史数据。
+        """
+        history = self._history()
+        if len(history.dates()) == 0:
+            for filename in reversed(self._list_filenames()):
+                if self._get_date(filename) < date:
+                    path = self.file_dir / filename
+                    history.append(self._get_date(filename), get_storage_by_path(path).read(path))
+        history.append(date, df)
+
     def get(self):
         """获取数据"""
         # self.df = ...
         pass
 
+    def fetch(self):
+        """获取数据。远程数据源的请求经过调度器 (限流、重试, 参考 utils.scheduler)。"""
+        name = self.__class__.__name__
+        try:
+            with metrics.timer(name, "fetch_seconds"):
+                if self.remote:
+                    (self.scheduler or scheduler).run(self.get, name=name)
+                else:
+                    self.get()
+        except Exception:
+            metrics.inc(name, "fetch_error")
+            raise
+
+    async def afetch(self):
+        """在 asyncio 中获取数据 (参考 fetch)"""
+        name = self.__class__.__name__
+        try:
+            with metrics.timer(name, "fetch_seconds"):
+                if self.remote:
+                    await (self.scheduler or scheduler).arun(self.get, name=name)
+                else:
+                    self.get()
+        except Exception:
+            metrics.inc(name, "fetch_error")
+            raise
+
+    def refresh(self, force=True):
+        """从数据源获取数据，保存并删除过期的数据文件。
+        多个进程同时更新时, 通过文件锁 (参考 lock) 依次进行。
+        :param force: 为 False 时, 如果获得锁之后数据已经不过期 (被其它进程更新), 则不再更新
+        :return: 是否更新了数据
+        """
+        with self.lock():
+            if not force and not self.is_expired():
+                return False
+            self.fetch()
+            self.save()
+            # 删除过期的数据
+            self._remove_expired()
+        return True
+
+    def refresh_background(self):
+        """在后台线程中更新数据。
+        同一个类在同一个数据目录中同时只有一个后台更新。
+        更新完成后设置 self.refreshed, 并调用 self.on_refresh(self)。
+        注意: self.df 不会自动替换成新数据, 可以在回调中调用 self.load() 重新加载。
+        """
+        name = self._registry_name()
+        with _refreshes_lock:
+            if name not in _refreshes:
+                _refreshes[name] = (threading.Event(), [])
+                loader = copy.copy(self)
+                loader._df = None
+                thread = threading.Thread(target=_revalidate, args=(loader,), daemon=True)
+                thread.start()
+            event, callbacks = _refreshes[name]
+            if self.on_refresh is not None:
+                callbacks.append(self)
+        self.refreshed = event
+        return event
+
     def update(self):
         """更新数据"""
-        self.get()
-        self.save()
-        # 删除过期的数据
-        self._remove_expired()
+        self._loading = True
+        try:
+            self.refresh()
+        finally:
+            self._loading = False
         # 重新加载数据
-        self.df = pd.read_csv(self.file_dir / self._get_filename())
+        self.df = self._read_latest()
         logger.info(f"[Update]: SUCCESS")
 
         return self
 
     def get_cache_date(self):
+        """获取最新数据文件的日期 (不加载数据)。如果文件不存在, 返回 None。"""
         filename = self._get_filename()
         if filename is None:
             return None
-        date = filename.split("_")[-1].split(".")[0]
-        return date
\ No newline at end of file
+        return self._get_date(filename)
+
+    def get_cache_entry(self):
+        """获取最新数据文件在清单中的记录 (行数、列结构哈希、内容哈希等)"""
+        filename = self._get_filename()
+        if filename is None:
+            return None
+        return get_manifest(self.file_dir).get(filename)
+
+
+# 正在后台更新的数据: 类名和数据目录 (参考 DFLoader._registry_name) -> (threading.Event, 等待回调的 loader 列表)
+_refreshes = {}
+_refreshes_lock = threading.Lock()
+
+
+def _revalidate(loader):
+    """后台线程: 更新数据, 然后通知等待的 loader"""
+    name = loader.__class__.__name__
+    success = True
+    try:
+        loader._loading = True
+        loader.refresh(force=False)
+        logger.info(f"[Refresh]: data = {name}, SUCCESS")
+    except Exception as e:
+        success = False
+        logger.warning(f"[Refresh]: data = {name}, FAIL, error = {e!r}")
+    with _refreshes_lock:
+        event, callbacks = _refreshes.pop(loader._registry_name())
+    event.set()
+    if success:
+        for waiter in callbacks:
+            waiter.on_refresh(waiter)
@@ -1,3 +1,5 @@
+from .stats import Stats
+
 
 class DFSummary(object):
 
@@ -16,14 +18,14 @@ class DFSummary(object):
             raise ValueError(f"Columns {miss} not found in dataframe.")
 
     def _statistics(self, col):
-        df = self.df[col].dropna()
-        num = len(df)
-        mean = round(df.mean(), 2)
-        std = round(df.std(), 2)
-        lb = round(df.min(), 2)
-        ub = round(df.max(), 2)
+        stats = Stats(self.df[col])
+        num = stats.num
+        mean = round(stats.mean, 2)
+        std = round(stats.std, 2)
+        lb = round(stats.lb, 2)
+        ub = round(stats.ub, 2)
         quantile_levels = [0.2, 0.5, 0.8]
-        quantiles = df.quantile(quantile_levels).values.tolist()
+        quantiles = stats.quantile(quantile_levels).tolist()
         # 结果保留两位小数
         quantiles = [round(q, 2) for q in quantiles]
         return {
@@ -0,0 +1,166 @@
+from pathlib import Path
+
+import pandas as pd
+
+from .logger import logger
+from .schema import apply_schema
+from .storage import atomic_write, get_storage, get_storage_by_path
+
+
+class HistoryStore:
+
+    """ 增量保存的历史快照
+    目录: data/history/<类名>/
+    - <日期>.base.<格式>: 完整快照
+    - <日期>.delta.<格式>: 相对前一个快照的变化, 只保存新增或修改的行 (_OP = "U")
+      和被删除的行的主键 (_OP = "D")
+    说明：按主键 key 比较相邻两个快照。如果没有主键、主键不唯一或者列发生变化，
+    则保存完整快照。重建的快照按主键排序。
+    """
+    op = "_OP"
+    base = "base"
+    delta = "delta"
+
+    def __init__(self, file_dir, name, key, storage="csv", **kwargs):
+        self.compact_every = 30  # 连续保存多少个增量后, 保存一个完整快照
+        self.keep = 365  # 历史数据保留天数
+        self.dtypes = None  # 列类型 (参考 utils.schema)
+        for k, v in kwargs.items():
+            setattr(self, k, v)
+        self.name = name
+        self.key = key if isinstance(key, list) or key is None else [key]
+        self.storage = get_storage(storage)
+        self.dir = Path(file_dir) / "history" / name
+
+    def _list(self):
+        """历史文件列表 [(日期, 类型, 路径), ...], 按日期从旧到新排序"""
+        if not self.dir.exists():
+            return []
+        files = []
+        for path in self.dir.iterdir():
+            parts = path.name.split(".")
+            if len(parts) != 3 or get_storage_by_path(path) is None:
+                continue
+            files.append((parts[0], parts[1], path))
+        files.sort(key=lambda x: x[0])
+        return files
+
+    def dates(self):
+        """所有历史快照的日期, 从旧到新"""
+        return [date for date, _, _ in self._list()]
+
+    def _has_key(self, df):
+        return (self.key is not None
+                and set(self.key) <= set(df.columns)
+                and not df.duplicated(subset=self.key).any())
+
+    @staticmethod
+    def _restore_dtypes(df, dtypes):
+        """增量文件中的列类型可能和完整快照不同 (例如含空值的整数列), 尽量恢复"""
+        for col, dtype in dtypes.items():
+            # 类别类型在重建完成后统一转换 (增量中可能有新的类别)
+            if isinstance(dtype, pd.CategoricalDtype):
+                continue
+            if col in df.columns and df[col].dtype != dtype:
+                try:
+                    df[col] = df[col].astype(dtype)
+                except (ValueError, TypeError):
+                    pass
+        return df
+
+    def _apply(self, state, delta):
+        """在 state 上应用增量 delta"""
+        upsert = delta[delta[self.op] == "U"].drop(columns=[self.op])
+        upsert = self._restore_dtypes(upsert, state.dtypes)
+        keys = pd.MultiIndex.from_frame(self._restore_dtypes(delta[self.key], state.dtypes).astype(object))
+        state_keys = pd.MultiIndex.from_frame(state[self.key].astype(object))
+        state = state[~state_keys.isin(keys)]
+        return pd.concat([state, upsert], ignore_index=True)
+
+    def _diff(self, prev, cur):
+        """计算 cur 相对 prev 的增量"""
+        prev = prev.set_index(self.key)
+        cur = cur.set_index(self.key)
+        deleted = prev.index.difference(cur.index)
+        inserted = cur.index.difference(prev.index)
+        common = cur.index.intersection(prev.index)
+        a = cur.loc[common]
+        b = prev.loc[common, a.columns]
+        changed = pd.Series(False, index=common)
+        for col in a.columns:
+            x = a[col].to_numpy(dtype=object)
+            y = b[col].to_numpy(dtype=object)
+            changed |= (x != y) & ~(pd.isna(x) & pd.isna(y))
+        upsert = cur.loc[inserted.append(common[changed.to_numpy()])].reset_index()
+        upsert[self.op] = "U"
+        removed = deleted.to_frame(index=False)
+        removed[self.op] = "D"
+        return pd.concat([upsert, removed], ignore_index=True)
+
+    def _sort(self, df):
+        if self._has_key(df):
+            df = df.sort_values(by=self.key, kind="stable")
+        return df.reset_index(drop=True)
+
+    def load(self, as_of):
+        """重建 as_of (YYYYMMDD) 当天或之前最近的快照"""
+        files = [f for f in self._list() if f[0] <= str(as_of)]
+        bases = [i for i, f in enumerate(files) if f[1] == self.base]
+        if len(bases) == 0:
+            raise ValueError(f"No history of {self.name} before {as_of}.")
+        path = files[bases[-1]][2]
+        state = apply_schema(get_storage_by_path(path).read(path), self.dtypes)
+        for _, _, path in files[bases[-1] + 1:]:
+            state = self._apply(state, get_storage_by_path(path).read(path))
+        return self._sort(apply_schema(state, self.dtypes))
+
+    def append(self, date, df):
+        """保存 date 的快照。如果已经存在当天的快照，则替换。"""
+        df = apply_schema(df, self.dtypes)
+        files = [f for f in self._list() if f[0] != date]
+        for f in self._list():
+            if f[0] == date:
+                f[2].unlink()
+        self.dir.mkdir(parents=True, exist_ok=True)
+        # 距离上一个完整快照的增量数量
+        n_delta = 0
+        for f in reversed(files):
+            if f[1] == self.base:
+                break
+            n_delta += 1
+        prev = self.load(files[-1][0]) if len(files) > 0 else None
+        if (prev is None or n_delta + 1 >= self.compact_every
+                or not self._has_key(df) or not self._has_key(prev)
+                or list(prev.columns) != list(df.columns)):
+            self._write(date, self.base, df)
+            return
+        delta = self._diff(prev, df)
+        # 变化太多时, 增量没有意义
+        if len(delta) >= len(df) / 2:
+            self._write(date, self.base, df)
+        else:
+            self._write(date, self.delta, delta)
+
+    def _write(self, date, kind, df):
+        path = self.dir / f"{date}.{kind}.{self.storage.suffix}"
+        atomic_write(self.storage, df, path)
+        logger.info(f"[History]: data = {self.name}, date = {date}, kind = {kind}, rows = {len(df)}")
+
+    def compact(self, keep=None):
+        """删除保留天数之前的历史数据。
+        如果最早保留的快照是增量, 先把它重建成完整快照。
+        """
+        keep = self.keep if keep is None else keep
+        files = self._list()
+        if len(files) == 0:
+            return
+        cutoff = (pd.Timestamp.today().normalize() - pd.Timedelta(days=keep)).strftime("%Y%m%d")
+        # 至少保留最新的快照
+        kept = [f for f in files if f[0] >= cutoff] or files[-1:]
+        first = kept[0]
+        if first[1] == self.delta:
+            self._write(first[0], self.base, self.load(first[0]))
+            first[2].unlink()
+        for f in files:
+            if f[0] < first[0]:
+                f[2].unlink()
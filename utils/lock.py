@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+
+    """ 跨进程的文件锁 (排它锁)
+    说明：同一个锁文件同时只能被一个进程 (或线程) 持有。进程退出时锁自动释放。
+    同一个线程可以重复获取同一个锁 (可重入)。
+    用法:
+        with FileLock("./data/.lock/FundStarDF.lock"):
+            ...
+    """
+
+    # 当前进程持有的锁: (锁文件, 线程) -> [文件描述符, 重入次数]
+    _held = {}
+
+    def __init__(self, path, timeout=None, poll=0.1):
+        self.path = Path(path)
+        self.timeout = timeout  # 等待时间 (单位: 秒), None 表示一直等待
+        self.poll = poll  # 轮询间隔 (单位: 秒)
+        self._fd = None
+
+    @property
+    def _key(self):
+        return str(self.path.resolve()), threading.get_ident()
+
+    def _try_lock(self, blocking):
+        try:
+            if fcntl is not None:
+                flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+                fcntl.flock(self._fd, flags)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def acquire(self):
+        key = self._key
+        if key in self._held:
+            self._held[key][1] += 1
+            return self
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT)
+        deadline = None if self.timeout is None else time.time() + self.timeout
+        # Windows 不支持阻塞等待, 统一用轮询
+        blocking = fcntl is not None and deadline is None
+        while not self._try_lock(blocking):
+            if deadline is not None and time.time() > deadline:
+                os.close(self._fd)
+                self._fd = None
+                raise TimeoutError(f"Timeout waiting for lock {self.path}.")
+            time.sleep(self.poll)
+        self._held[key] = [self._fd, 1]
+        return self
+
+    def release(self):
+        key = self._key
+        if key not in self._held:
+            return
+        self._held[key][1] -= 1
+        if self._held[key][1] > 0:
+            return
+        self._fd = self._held.pop(key)[0]
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        os.close(self._fd)
+        self._fd = None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
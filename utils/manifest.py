@@ -0,0 +1,245 @@
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from .lock import FileLock
+from .logger import logger
+from .schema import apply_schema
+from .storage import get_storage_by_path
+
+
+class Manifest:
+
+    """ 数据目录的快照清单 (data/manifest.json)
+    说明：记录每个数据文件的类名、日期、文件名、行数、列结构哈希和内容哈希，
+    查找最新快照和判断过期时不需要再遍历数据目录。
+    清单文件的修改时间与数据目录保持一致；如果清单不存在、无法解析，
+    或者数据目录在清单之外被修改过（例如手动增删文件），就重新扫描目录生成清单。
+    重新扫描时, 文件大小和修改时间都没有变化的文件直接使用旧记录, 只读取新增或修改过的文件。
+    多个进程修改清单时, 通过文件锁 (data/.lock/manifest.lock) 互斥。
+    写入数据文件和更新清单要在 lock() 内完成, 其它进程不会看到两者之间的状态。
+    """
+    filename = "manifest.json"
+    version = 1
+
+    def __init__(self, file_dir):
+        self.file_dir = Path(file_dir)
+        self.path = self.file_dir / self.filename
+        self._entries = {}  # 文件名 -> 记录
+        self._index = {}  # 类名 -> 文件名列表 (最新的在前面)
+        self._mtime = None  # 已加载的清单的修改时间
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(self.file_dir / ".lock" / "manifest.lock")
+
+    @staticmethod
+    def parse(filename):
+        """解析数据文件名, 例如 FundStarDF_20240101.csv -> (FundStarDF, 20240101)。
+        如果不是数据文件，返回 None。
+        """
+        if get_storage_by_path(filename) is None or filename.startswith("."):
+            return None
+        stem = filename.rsplit(".", 1)[0]
+        if "_" not in stem:
+            return None
+        name, date = stem.rsplit("_", 1)
+        if len(date) != 8 or not date.isdigit():
+            return None
+        return name, date
+
+    @staticmethod
+    def schema_hash(df):
+        """列结构哈希。df 是加载后的数据 (读取文件后按 dtypes 转换列类型), 与文件格式无关"""
+        schema = [[str(col), str(dtype)] for col, dtype in df.dtypes.items()]
+        return hashlib.sha1(json.dumps(schema).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def content_hash(path):
+        sha1 = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha1.update(chunk)
+        return sha1.hexdigest()
+
+    @staticmethod
+    def _dtypes(name):
+        """类名对应的 DFLoader 子类的列类型。找不到对应的类 (没有 import) 时返回 False"""
+        from .dfloader import DFLoader
+        from .warmer import get_loaders
+        for cls in get_loaders(DFLoader):
+            if cls.__name__ == name:
+                return cls.dtypes
+        return False
+
+    def make_entry(self, filename, df):
+        """生成一个数据文件的记录
+        :param df: 加载后的数据 (参考 schema_hash)
+        """
+        name, date = self.parse(filename)
+        path = self.file_dir / filename
+        stat = path.stat()
+        return {
+            "class": name,
+            "date": date,
+            "path": filename,
+            "rows": int(len(df)),
+            "schema_hash": self.schema_hash(df),
+            "content_hash": self.content_hash(path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+
+    @contextmanager
+    def lock(self):
+        """修改数据目录时持有的锁 (线程锁和跨进程的文件锁, 都可以重入)。
+        用法:
+            with manifest.lock():
+                atomic_write(...)
+                manifest.add(manifest.make_entry(...))
+        """
+        with self._lock, self._file_lock:
+            yield self
+
+    def _is_stale(self):
+        """清单不存在，或数据目录在清单之外被修改过"""
+        if not self.path.exists():
+            return True
+        return self.file_dir.stat().st_mtime_ns != self.path.stat().st_mtime_ns
+
+    def _refresh(self, check_dir=True):
+        """必要时从磁盘重新加载或重建清单。
+        :param check_dir: 是否检查数据目录在清单之外被修改过
+            (写入数据文件后更新清单时为 False, 因为目录刚被自己修改过)
+        """
+        if not self.path.exists() or (check_dir and self._is_stale()):
+            self.rebuild()
+            return
+        if self.path.stat().st_mtime_ns == self._mtime:
+            return
+        if not self._load():
+            self.rebuild(force=True)
+
+    def _load(self):
+        """从磁盘加载清单。成功时返回 True"""
+        try:
+            mtime = self.path.stat().st_mtime_ns
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            assert data["version"] == self.version
+            self._set_entries(data["entries"])
+            self._mtime = mtime
+            return True
+        except (OSError, ValueError, KeyError, AssertionError):
+            return False
+
+    def _set_entries(self, entries):
+        self._entries = {e["path"]: e for e in entries}
+        self._index = {}
+        for e in entries:
+            self._index.setdefault(e["class"], []).append(e["path"])
+        for filenames in self._index.values():
+            filenames.sort(key=lambda x: self._entries[x]["date"], reverse=True)
+
+    def _write(self):
+        """原子写入清单：先写临时文件，再重命名"""
+        data = {
+            "version": self.version,
+            "entries": list(self._entries.values()),
+        }
+        tmp = self.file_dir / f".{self.filename}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
+        # 清单的修改时间与数据目录保持一致，用于判断清单是否过时
+        mtime = self.file_dir.stat().st_mtime_ns
+        os.utime(self.path, ns=(mtime, mtime))
+        self._mtime = mtime
+
+    def _read_entries(self):
+        """读取磁盘上的清单记录。如果不存在或无法解析，返回空字典。"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return {e["path"]: e for e in json.load(f)["entries"]}
+        except (OSError, ValueError, KeyError, TypeError):
+            return {}
+
+    def rebuild(self, force=False):
+        """扫描数据目录，重新生成清单。
+        文件大小和修改时间没有变化时, 直接使用旧记录 (不读取文件);
+        否则读取文件重新生成记录, 内容没有变化时保留旧记录中的附加信息 (例如派生数据的 inputs)。
+        :param force: 为 False 时, 如果获得锁之后清单已经是最新的 (被其它进程更新), 只重新加载
+        """
+        with self._lock, self._file_lock:
+            if not force and not self._is_stale() and self._load():
+                return
+            old = {**self._read_entries(), **self._entries}
+            entries = []
+            parsed = 0
+            for path in Path.iterdir(self.file_dir):
+                if self.parse(path.name) is None:
+                    continue
+                try:
+                    stat = path.stat()
+                    e = old.get(path.name)
+                    if e is not None and e.get("size") == stat.st_size and e.get("mtime_ns") == stat.st_mtime_ns:
+                        entries.append(e)
+                        continue
+                    df = get_storage_by_path(path).read(path)
+                except FileNotFoundError:
+                    # 文件刚被其它进程删除
+                    continue
+                parsed += 1
+                dtypes = self._dtypes(self.parse(path.name)[0])
+                entry = self.make_entry(path.name, df if dtypes is False else apply_schema(df, dtypes))
+                if dtypes is False:
+                    # 不知道加载时的列类型, 不记录列结构哈希
+                    entry["schema_hash"] = None
+                if path.name in old and old[path.name].get("content_hash") == entry["content_hash"]:
+                    entry = {**old[path.name], **entry}
+                entries.append(entry)
+            self._set_entries(entries)
+            self._write()
+            if parsed > 0 or len(entries) != len(old):
+                logger.info(f"[Manifest]: rebuild, count = {len(entries)}, parsed = {parsed}")
+
+    def filenames(self, name):
+        """某个类的所有数据文件名称，最新的在前面"""
+        with self._lock:
+            self._refresh()
+            return list(self._index.get(name, []))
+
+    def get(self, filename):
+        """某个数据文件的记录。如果不存在，返回 None。"""
+        with self._lock:
+            self._refresh()
+            return self._entries.get(filename)
+
+    def add(self, entry):
+        with self._lock, self._file_lock:
+            self._refresh(check_dir=False)
+            entries = list(self._entries.values())
+            entries = [e for e in entries if e["path"] != entry["path"]]
+            self._set_entries([*entries, entry])
+            self._write()
+
+    def remove(self, filename):
+        with self._lock, self._file_lock:
+            self._refresh(check_dir=False)
+            entries = [e for e in self._entries.values() if e["path"] != filename]
+            self._set_entries(entries)
+            self._write()
+
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+
+def get_manifest(file_dir):
+    """获取数据目录对应的清单（同一个目录共享一个实例）"""
+    key = str(Path(file_dir).resolve())
+    with _manifests_lock:
+        if key not in _manifests:
+            _manifests[key] = Manifest(file_dir)
+        return _manifests[key]
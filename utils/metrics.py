@@ -0,0 +1,109 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class Metrics:
+
+    """ 数据源的运行指标 (进程内)
+    说明：按数据源名称记录三类指标:
+    - 计数 (inc): 例如 cache_hit, cache_miss
+    - 当前值 (set): 例如 rows, file_bytes, memory_bytes, snapshot_age_days
+    - 耗时 (timer / observe): 例如 fetch_seconds, parse_seconds, save_seconds,
+      记录次数、总和、最大值和最近一次的值
+    用法:
+        with metrics.timer("FundStarDF", "fetch_seconds"):
+            ...
+        metrics.dump("metrics.json")  # 或者 metrics.prom
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._timings = {}
+
+    def inc(self, name, metric, n=1):
+        with self._lock:
+            key = (name, metric)
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    def set(self, name, metric, value):
+        with self._lock:
+            self._gauges[(name, metric)] = value
+
+    def observe(self, name, metric, seconds):
+        with self._lock:
+            t = self._timings.setdefault((name, metric), {"count": 0, "sum": 0.0, "max": 0.0, "last": 0.0})
+            t["count"] += 1
+            t["sum"] += seconds
+            t["max"] = max(t["max"], seconds)
+            t["last"] = seconds
+
+    @contextmanager
+    def timer(self, name, metric):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, metric, time.perf_counter() - start)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._timings.clear()
+
+    def get(self, name=None):
+        """指标的字典: 数据源 -> 指标 -> 值。如果指定 name, 只返回该数据源的指标。"""
+        with self._lock:
+            result = {}
+            for (n, metric), v in self._counters.items():
+                result.setdefault(n, {})[metric] = v
+            for (n, metric), v in self._gauges.items():
+                result.setdefault(n, {})[metric] = v
+            for (n, metric), v in self._timings.items():
+                result.setdefault(n, {})[metric] = dict(v)
+        if name is not None:
+            return result.get(name, {})
+        return result
+
+    def to_json(self):
+        return json.dumps(self.get(), indent=2, ensure_ascii=False)
+
+    def to_prometheus(self, prefix="whichfund"):
+        """Prometheus 文本格式"""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            timings = {k: dict(v) for k, v in self._timings.items()}
+        lines = []
+        for metric in sorted({m for _, m in counters}):
+            lines.append(f"# TYPE {prefix}_{metric}_total counter")
+            for (name, m), v in sorted(counters.items()):
+                if m == metric:
+                    lines.append(f'{prefix}_{metric}_total{{data="{name}"}} {v}')
+        for metric in sorted({m for _, m in gauges}):
+            lines.append(f"# TYPE {prefix}_{metric} gauge")
+            for (name, m), v in sorted(gauges.items()):
+                if m == metric:
+                    lines.append(f'{prefix}_{metric}{{data="{name}"}} {v}')
+        for metric in sorted({m for _, m in timings}):
+            lines.append(f"# TYPE {prefix}_{metric} summary")
+            for (name, m), v in sorted(timings.items()):
+                if m == metric:
+                    lines.append(f'{prefix}_{metric}_count{{data="{name}"}} {v["count"]}')
+                    lines.append(f'{prefix}_{metric}_sum{{data="{name}"}} {v["sum"]:.6f}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """保存指标。文件后缀为 .prom 时保存为 Prometheus 文本格式, 否则保存为 JSON。"""
+        path = Path(path)
+        text = self.to_prometheus() if path.suffix == ".prom" else self.to_json()
+        path.write_text(text, encoding="utf-8")
+
+
+# 进程内共享的指标
+metrics = Metrics()
@@ -0,0 +1,64 @@
+import threading
+from collections import OrderedDict
+
+
+class DFRegistry:
+
+    """ 进程内共享的数据缓存
+    说明：按 (名称, 快照日期) 缓存已经加载的 DataFrame，同一份数据在一次运行中只读取一次。
+    名称包括类名和数据目录 (参考 DFLoader._registry_name)。
+    返回给调用方的是浅拷贝（pandas 开启 Copy-on-Write 时即为写时复制的视图），
+    调用方增加或修改列不会影响缓存中的数据。
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes  # 内存上限 (单位: 字节), None 表示不限制
+        self._frames = OrderedDict()  # (name, date) -> (df, nbytes), 最近使用的在最后
+        self._bytes = 0
+        self._lock = threading.RLock()
+
+    def get(self, name, date):
+        """获取缓存的数据。如果不存在，返回 None。"""
+        with self._lock:
+            key = (name, date)
+            if key not in self._frames:
+                return None
+            self._frames.move_to_end(key)
+            df, _ = self._frames[key]
+            return df.copy(deep=False)
+
+    def put(self, name, date, df):
+        """缓存数据。同一个类只保留一个快照。"""
+        with self._lock:
+            self.invalidate(name)
+            nbytes = int(df.memory_usage(deep=True).sum())
+            self._frames[(name, date)] = (df, nbytes)
+            self._bytes += nbytes
+            self._evict()
+        return df.copy(deep=False)
+
+    def invalidate(self, name=None):
+        """删除缓存。name 为 None 时删除所有缓存。"""
+        with self._lock:
+            for key in list(self._frames.keys()):
+                if name is None or key[0] == name:
+                    _, nbytes = self._frames.pop(key)
+                    self._bytes -= nbytes
+
+    def _evict(self):
+        """按最近最少使用 (LRU) 的顺序删除缓存，直到满足内存上限。"""
+        if self.max_bytes is None:
+            return
+        while self._bytes > self.max_bytes and len(self._frames) > 0:
+            _, (_, nbytes) = self._frames.popitem(last=False)
+            self._bytes -= nbytes
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    def __len__(self):
+        return len(self._frames)
+
+
+registry = DFRegistry()
@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+
+from .logger import logger
+from .waiter import WT
+
+
+class FetchScheduler:
+
+    """ 远程数据源的请求调度 (限流、并发数限制、失败重试)
+    说明：
+    - 令牌桶限流: 平均每秒最多 rate 个请求, 允许 burst 个请求的突发。
+    - 最多同时进行 max_workers 个请求。
+    - 失败后等待随机时间 (参考 WT) 再重试, 等待时间随重试次数翻倍, 不超过 WT.ub。
+    同一个调度器可以同时在多个线程 (run) 和 asyncio (arun) 中使用, 共享限流和并发数。
+    时钟 clock 和等待函数 sleep / async_sleep 可以替换, 便于离线测试 (async_sleep 需要让出事件循环)。
+    """
+
+    def __init__(self, clock=time.monotonic, sleep=time.sleep, async_sleep=asyncio.sleep, **kwargs):
+        self.rate = 1.0  # 每秒请求数
+        self.burst = 2  # 令牌桶容量
+        self.max_workers = 2  # 最大并发请求数
+        self.retries = 3  # 失败后的重试次数
+        self.wait_time = WT._wait_time  # 重试等待时间 (单位: 毫秒)
+        self.poll = 0.05  # asyncio 等待并发名额时的轮询间隔 (单位: 秒)
+        for k, v in kwargs.items():
+            setattr(self, k, v)
+        self.clock = clock
+        self.sleep = sleep
+        self.async_sleep = async_sleep
+        self._lock = threading.Condition()
+        self._tokens = self.burst
+        self._updated = clock()
+        self._running = 0
+
+    def _reserve(self):
+        """预定一个令牌, 返回需要等待的时间 (单位: 秒)。
+        令牌不足时令牌数会变成负数, 表示已经被预定的令牌, 后面的请求依次排队。
+        """
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+    def _try_enter(self):
+        with self._lock:
+            if self._running >= self.max_workers:
+                return False
+            self._running += 1
+            return True
+
+    def _enter(self):
+        with self._lock:
+            while self._running >= self.max_workers:
+                self._lock.wait()
+            self._running += 1
+
+    def _exit(self):
+        with self._lock:
+            self._running -= 1
+            self._lock.notify()
+
+    def _backoff(self, attempt):
+        """第 attempt 次重试前的等待时间 (单位: 秒)"""
+        return min(self.wait_time() * 2 ** (attempt - 1), WT.ub) / 1000
+
+    def _log_retry(self, name, attempt, error, delay):
+        logger.warning(f"[Fetch]: data = {name}, attempt = {attempt}, "
+                       f"error = {error!r}, wait = {delay * 1000:.0f} ms")
+
+    def run(self, fn, *args, name=None, **kwargs):
+        """在当前线程中执行请求 fn(*args, **kwargs), 返回 fn 的结果。
+        重试 retries 次后仍然失败, 抛出最后一次的异常。
+        """
+        name = name or getattr(fn, "__qualname__", repr(fn))
+        for attempt in range(self.retries + 1):
+            self._enter()
+            try:
+                self.sleep(self._reserve())
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                error = e
+            finally:
+                self._exit()
+            delay = self._backoff(attempt + 1)
+            self._log_retry(name, attempt + 1, error, delay)
+            self.sleep(delay)
+
+    async def arun(self, fn, *args, name=None, **kwargs):
+        """在 asyncio 中执行请求, 返回结果。
+        fn 可以是协程函数; 普通函数在线程池中执行 (不阻塞事件循环)。
+        """
+        name = name or getattr(fn, "__qualname__", repr(fn))
+        for attempt in range(self.retries + 1):
+            while not self._try_enter():
+                await self.async_sleep(self.poll)
+            try:
+                await self.async_sleep(self._reserve())
+                if asyncio.iscoroutinefunction(fn):
+                    return await fn(*args, **kwargs)
+                return await asyncio.to_thread(fn, *args, **kwargs)
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                error = e
+            finally:
+                self._exit()
+            delay = self._backoff(attempt + 1)
+            self._log_retry(name, attempt + 1, error, delay)
+            await self.async_sleep(delay)
+
+
+# 进程内共享的调度器, 所有远程数据源的请求都经过它
+scheduler = FetchScheduler()
@@ -0,0 +1,62 @@
+import pandas as pd
+
+from .storage import get_storage_by_path
+
+
+def to_code(s, width=6):
+    """把基金代码转换成定长字符串, 例如 1 -> "000001" """
+    code = s.astype(str).str.zfill(width)
+    return code.where(s.notna())
+
+
+def apply_schema(df, dtypes):
+    """按 dtypes 转换列类型。
+    :param dtypes: dict, 列名 -> 类型。类型可以是 pandas 支持的类型 (例如 category, float32),
+        或者 "code" (定长字符串的基金代码)。不存在的列会被忽略。
+    """
+    if not dtypes:
+        return df
+    df = df.copy(deep=False)
+    for col, dtype in dtypes.items():
+        if col not in df.columns:
+            continue
+        if dtype == "code":
+            df[col] = to_code(df[col])
+        elif str(dtype).startswith(("float", "int")):
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(dtype)
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def memory_report(loaders):
+    """各个数据源在应用 dtypes 之前和之后的内存占用。
+    :param loaders: DFLoader 子类的列表
+    :return: DataFrame, 字段如下：
+        - NAME: 数据源
+        - ROWS: 行数
+        - RAW_MB: 不转换类型时的内存 (单位: MB)
+        - TYPED_MB: 转换类型后的内存 (单位: MB)
+        - RATIO: TYPED_MB / RAW_MB
+    """
+    rows = []
+    for cls in loaders:
+        loader = cls(lazy=True)
+        filename = loader._get_filename()
+        if filename is None:
+            continue
+        path = loader.file_dir / filename
+        raw = get_storage_by_path(path).read(path)
+        # 列式格式保存的是转换后的类型, 先还原成默认类型
+        for col in cls.dtypes or {}:
+            if col not in raw.columns:
+                continue
+            if isinstance(raw[col].dtype, pd.CategoricalDtype):
+                raw[col] = raw[col].astype(object)
+            elif raw[col].dtype == "float32":
+                raw[col] = raw[col].astype("float64")
+        typed = apply_schema(raw, cls.dtypes)
+        raw_mb = raw.memory_usage(deep=True).sum() / 2 ** 20
+        typed_mb = typed.memory_usage(deep=True).sum() / 2 ** 20
+        rows.append([cls.__name__, len(raw), raw_mb, typed_mb, typed_mb / raw_mb])
+    return pd.DataFrame(rows, columns=["NAME", "ROWS", "RAW_MB", "TYPED_MB", "RATIO"])
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+
+class Stats:
+
+    """ 一列数据的统计量 (忽略空值)
+    说明：数据只排序一次, 之后的分位数、中位数和分桶计数都在排好序的数组上用 searchsorted 或者下标计算,
+    不再重复扫描数据。分位数的算法和 np.quantile 的默认方法相同 (线性插值)。
+    - num, mean, std, lb, ub: 数量, 均值, 标准差 (ddof=1), 最小值, 最大值
+    - quantile(q): 一个或多个分位数
+    - median(): 中位数
+    - less(x, inclusive): 小于 (或小于等于) x 的数量
+    - count(edges, closed): 区间 [edges[i], edges[i+1]) 或者 (edges[i], edges[i+1]] 内的数量
+    """
+
+    def __init__(self, values):
+        if isinstance(values, (pd.Series, pd.Index)):
+            if isinstance(values.dtype, np.dtype) and values.dtype.kind == "f":
+                values = values.to_numpy()
+            else:
+                values = values.to_numpy(dtype="float64", na_value=np.nan)
+        values = np.asarray(values)
+        if values.dtype.kind != "f":
+            values = values.astype("float64")
+        # 浮点数保留原来的精度 (例如 float32), 和 pandas 的计算结果相同
+        values = values[~np.isnan(values)]
+        self.values = np.sort(values)
+        self.num = len(values)
+        if self.num > 0:
+            # 按原始顺序求和; 方差和 pandas 一样用 float64 计算
+            self.mean = values.sum() / self.num
+            mean = values.sum(dtype="float64") / self.num
+            var = ((values - mean) ** 2).sum() / (self.num - 1) if self.num > 1 else np.nan
+            self.std = np.sqrt(values.dtype.type(var))
+            self.lb = self.values[0]
+            self.ub = self.values[-1]
+        else:
+            self.mean = self.std = self.lb = self.ub = np.nan
+
+    def quantile(self, q):
+        """分位数
+        :param q: 0~1 之间的数, 或者它们的列表
+        :return: q 是列表时返回 np.ndarray, 否则返回一个数
+        """
+        scalar = np.ndim(q) == 0
+        q = np.asarray(q, dtype="float64")
+        if self.num == 0:
+            result = np.full(q.shape, np.nan)
+        else:
+            index = q * (self.num - 1)
+            previous = np.clip(np.floor(index), 0, self.num - 1).astype(int)
+            following = np.clip(previous + 1, 0, self.num - 1)
+            gamma = index - previous
+            a = self.values[previous]
+            b = self.values[following]
+            diff = b - a
+            result = np.where(gamma >= 0.5, b - diff * (1 - gamma), a + diff * gamma)
+        return result[()] if scalar else result
+
+    def median(self):
+        if self.num == 0:
+            return np.nan
+        half = self.num // 2
+        if self.num % 2:
+            return self.values[half]
+        return (self.values[half - 1] + self.values[half]) / 2
+
+    def less(self, x, inclusive=False):
+        """小于 x 的数量, inclusive 为 True 时计算小于等于 x 的数量 (x 可以是数组)"""
+        return np.searchsorted(self.values, x, side="right" if inclusive else "left")
+
+    def count(self, edges, closed="left"):
+        """分桶计数
+        :param edges: 递增的区间端点, 例如 [0, 3, 5, math.inf]
+        :param closed: "left" 代表区间 [edges[i], edges[i+1]), "right" 代表区间 (edges[i], edges[i+1]]
+        :return: np.ndarray, 长度比 edges 少 1
+        """
+        return np.diff(self.less(edges, inclusive=closed == "right"))
@@ -0,0 +1,186 @@
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+from .logger import logger
+
+
+class CSVStorage:
+
+    """ CSV 格式
+    说明：通用、可读，但每次读取都要重新解析和推断类型。
+    """
+    name = "csv"
+    suffix = "csv"
+    columnar = False
+    # 读取时按字符串处理的列（避免 "000001" 被解析成整数 1）
+    str_columns = ["CODE"]
+
+    @classmethod
+    def read(cls, path, columns=None):
+        return pd.read_csv(path, usecols=columns,
+                           dtype={col: str for col in cls.str_columns})
+
+    @classmethod
+    def write(cls, df, path):
+        df.to_csv(path, index=False)
+
+
+class FeatherStorage:
+
+    """ Arrow IPC (Feather) 列式格式
+    说明：保留列类型，读取时不需要解析，可以内存映射。需要安装 pyarrow。
+    """
+    name = "feather"
+    suffix = "feather"
+    columnar = True
+    memory_map = True  # 读取时是否使用内存映射
+
+    @classmethod
+    def read(cls, path, columns=None):
+        from pyarrow import feather
+        table = feather.read_table(path, columns=columns, memory_map=cls.memory_map)
+        return table.to_pandas()
+
+    @classmethod
+    def write(cls, df, path):
+        df.reset_index(drop=True).to_feather(path)
+
+
+class ParquetStorage:
+
+    """ Parquet 列式格式
+    说明：保留列类型，压缩率高，适合长期保存。需要安装 pyarrow。
+    """
+    name = "parquet"
+    suffix = "parquet"
+    columnar = True
+
+    @classmethod
+    def read(cls, path, columns=None):
+        return pd.read_parquet(path, columns=columns)
+
+    @classmethod
+    def write(cls, df, path):
+        df.to_parquet(path, index=False)
+
+
+storages = {
+    CSVStorage.name: CSVStorage,
+    FeatherStorage.name: FeatherStorage,
+    ParquetStorage.name: ParquetStorage,
+}
+
+
+def get_storage(name):
+    """根据名称获取存储格式"""
+    assert name in storages.keys(), f"storage must be in {list(storages.keys())}"
+    return storages[name]
+
+
+def get_storage_by_path(path):
+    """根据文件后缀获取存储格式。如果后缀不支持，返回 None。"""
+    suffix = Path(path).suffix.lstrip(".")
+    for storage in storages.values():
+        if storage.suffix == suffix:
+            return storage
+    return None
+
+
+def atomic_write(storage, df, path):
+    """原子写入: 先写入同一目录下的临时文件, 再重命名。
+    读取方不会看到写了一半的文件; 写入失败时也不会留下损坏的文件。
+    """
+    path = Path(path)
+    tmp = path.parent / f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        storage.write(df, tmp)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+# 数据目录的存储格式配置 (参考 get_dir_storage)
+config_name = "storage.json"
+
+
+def get_dir_storage(file_dir):
+    """数据目录的存储格式名称: 迁移 (参考 migrate) 之后为目标格式, 否则为 csv。
+    DFLoader.storage 为 None 时, 按这个格式保存数据, 同一天有多种格式的文件时优先读取这个格式。
+    """
+    try:
+        with open(Path(file_dir) / config_name, "r", encoding="utf-8") as f:
+            return json.load(f)["storage"]
+    except (OSError, ValueError, KeyError):
+        return CSVStorage.name
+
+
+def set_dir_storage(file_dir, storage):
+    """设置数据目录的存储格式 (参考 get_dir_storage)"""
+    get_storage(storage)
+    path = Path(file_dir) / config_name
+    tmp = path.parent / f".{path.name}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"storage": storage}, f)
+    os.replace(tmp, path)
+
+
+def migrate(file_dir="./data", storage="feather", remove=False, loaders=None):
+    """把数据目录中的 CSV 数据文件转换成 storage 格式（一次性迁移）, 并把数据目录的存储格式设置为 storage,
+    之后 DFLoader (storage 为 None 时) 读取和保存的都是 storage 格式的文件。
+    :param file_dir: 数据目录
+    :param storage: 目标格式, 例如 feather, parquet
+    :param remove: 转换成功后是否删除原来的 CSV 文件
+    :param loaders: DFLoader 子类的列表, 按它们的 dtypes 转换列类型后再保存。
+        默认是所有已 import 的 DFLoader 子类; 找不到对应的类的文件不转换
+    :return: 转换后的文件列表
+    """
+    from .dfloader import DFLoader
+    from .manifest import get_manifest
+    from .schema import apply_schema
+    from .warmer import get_loaders
+
+    target = get_storage(storage)
+    file_dir = Path(file_dir)
+    dtypes = {cls.__name__: cls.dtypes for cls in (loaders or get_loaders(DFLoader))}
+    manifest = get_manifest(file_dir)
+    migrated = []
+    for path in sorted(file_dir.glob(f"*.{CSVStorage.suffix}")):
+        parsed = manifest.parse(path.name)
+        if parsed is None:
+            continue
+        if parsed[0] not in dtypes:
+            logger.warning(f"[Migrate]: {path.name}, skip (unknown loader)")
+            continue
+        new_path = path.with_suffix(f".{target.suffix}")
+        if new_path.exists():
+            continue
+        # 列式格式保存列类型, 读取时不需要再转换
+        df = apply_schema(CSVStorage.read(path), dtypes[parsed[0]])
+        with manifest.lock():
+            atomic_write(target, df, new_path)
+            # 列结构哈希按加载后的数据计算 (参考 Manifest.schema_hash)
+            loaded = apply_schema(target.read(new_path), dtypes[parsed[0]])
+            manifest.add(manifest.make_entry(new_path.name, loaded))
+            if remove:
+                path.unlink()
+                manifest.remove(path.name)
+        migrated.append(new_path)
+        logger.info(f"[Migrate]: {path.name} -> {new_path.name}")
+    set_dir_storage(file_dir, storage)
+    return migrated
+
+
+if __name__ == "__main__":
+    # 用法: python -m utils.storage [feather|parquet]
+    # 注册所有的数据源 (参考 warm.py)
+    import fundrate.df
+    import fundstar.df
+    import fundmgr.df
+    import pool.df
+    migrate(storage=sys.argv[1] if len(sys.argv) > 1 else "feather")
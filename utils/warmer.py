@@ -0,0 +1,125 @@
+import queue
+import threading
+import time
+
+from .dfloader import DFLoader
+from .logger import logger
+from .scheduler import FetchScheduler, scheduler as shared_scheduler
+
+
+def get_loaders(cls=DFLoader):
+    """获取 cls 的所有子类 (包括子类的子类)。
+    注意：只能找到已经 import 的子类。
+    """
+    loaders = []
+    for sub in cls.__subclasses__():
+        loaders.append(sub)
+        loaders.extend(get_loaders(sub))
+    return loaders
+
+
+def fetch(loader):
+    """默认的获取数据的方法: 调用 loader.fetch() (经过 loader.scheduler 限流和重试, 参考 warm)"""
+    loader.fetch()
+    return loader.df
+
+
+def warm(loaders=None, fetch=fetch, max_workers=4, timeout=600, force=False, scheduler=None):
+    """并发更新过期的数据 (缓存预热)。
+    :param loaders: DFLoader 子类的列表, 默认是所有已 import 的远程数据源 (remote = True)
+    :param fetch: 获取数据的方法, fetch(loader) -> DataFrame
+    :param max_workers: 最大线程数
+    :param timeout: 每个数据源的超时时间 (单位: 秒), 从开始获取数据时计时
+    :param force: 为 True 时, 不管是否过期都更新
+    :param scheduler: 远程请求的调度器 (参考 utils.scheduler.FetchScheduler)。
+        默认新建一个调度器: 限流和重试参数与进程内共享的 scheduler 相同, 最大并发数为 max_workers。
+        注意: 共享的 scheduler 最多同时进行 2 个请求, 使用它时 max_workers 大于 2 没有作用。
+    :return: dict, 数据源名称 -> {"status": ..., "seconds": ..., "error": ...}
+        status: "ok" - 更新成功, "skip" - 未过期, "fail" - 获取失败, "timeout" - 超时
+    说明：超时的数据源不再等待, 由新的线程接着更新剩下的数据源。
+    正在进行的请求无法中止, 但它返回后不会保存数据, 并立即释放文件锁。
+    线程都是守护线程, 不会阻止进程退出 (进程退出时文件锁自动释放)。
+    """
+    if loaders is None:
+        loaders = [cls for cls in get_loaders() if cls.remote]
+    if scheduler is None:
+        scheduler = FetchScheduler(rate=shared_scheduler.rate, burst=shared_scheduler.burst,
+                                   retries=shared_scheduler.retries, wait_time=shared_scheduler.wait_time,
+                                   max_workers=max_workers)
+
+    summary = {}
+    todo = queue.Queue()
+    for cls in loaders:
+        loader = cls(lazy=True, scheduler=scheduler)
+        if not force and not loader.is_expired():
+            summary[cls.__name__] = {"status": "skip", "seconds": 0, "error": None}
+            continue
+        todo.put(loader)
+
+    started = {}
+    # 数据源名称 -> 超时后设置的事件
+    cancelled = {loader.__class__.__name__: threading.Event() for loader in list(todo.queue)}
+    results = queue.Queue()
+
+    def run(loader, cancel):
+        # 和其它进程的更新互斥; 等待期间数据可能已经被更新
+        with loader.lock():
+            if cancel.is_set() or (not force and not loader.is_expired()):
+                return False
+            df = fetch(loader)
+            # 已经超时, 结果被忽略, 不再保存
+            if cancel.is_set():
+                return False
+            if df is None or df.empty:
+                raise ValueError("empty data")
+            loader.df = df
+            loader.save()
+            loader._remove_expired()
+        return True
+
+    def worker():
+        while True:
+            try:
+                loader = todo.get_nowait()
+            except queue.Empty:
+                return
+            name = loader.__class__.__name__
+            started[name] = time.time()
+            try:
+                results.put((name, run(loader, cancelled[name]), None))
+            except Exception as e:
+                results.put((name, None, e))
+            if cancelled[name].is_set():
+                return  # 已经有新的线程接替
+
+    def start_worker():
+        threading.Thread(target=worker, name="warm", daemon=True).start()
+
+    for _ in range(min(max_workers, len(cancelled))):
+        start_worker()
+    pending = set(cancelled.keys())
+    while len(pending) > 0:
+        try:
+            name, result, error = results.get(timeout=min(1, timeout))
+        except queue.Empty:
+            name = None
+        now = time.time()
+        if name in pending:
+            seconds = now - started.get(name, now)
+            if error is None:
+                status = "ok" if result else "skip"
+                summary[name] = {"status": status, "seconds": seconds, "error": None}
+            else:
+                summary[name] = {"status": "fail", "seconds": seconds, "error": repr(error)}
+            pending.remove(name)
+        for name in list(pending):
+            if name in started and now - started[name] > timeout:
+                cancelled[name].set()
+                summary[name] = {"status": "timeout", "seconds": now - started[name], "error": None}
+                pending.remove(name)
+                start_worker()
+
+    for name, r in summary.items():
+        logger.info(f"[Warm]: data = {name}, status = {r['status']}, "
+                    f"seconds = {r['seconds']:.2f}, error = {r['error']}")
+    return summary
@@ -0,0 +1,22 @@
+import sys
+
+from utils import metrics
+from utils.warmer import warm
+
+
+if __name__ == "__main__":
+    # 注册所有的数据源
+    import fundrate.df
+    import fundstar.df
+    import fundmgr.df
+    import pool.df
+    # 并发更新所有过期的数据源
+    summary = warm()
+    failed = [name for name, r in summary.items() if r["status"] in ("fail", "timeout")]
+    print(f"==== Warm ====")
+    print(f"|-- 数据源数量: {len(summary)}, 失败数量: {len(failed)}")
+    for name in failed:
+        print(f"|-- [{name}]: {summary[name]['status']}, {summary[name]['error']}")
+    # 保存运行指标, 例如: python warm.py metrics.json 或 metrics.prom
+    if len(sys.argv) > 1:
+        metrics.dump(sys.argv[1])